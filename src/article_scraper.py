@@ -1,7 +1,6 @@
 import argparse
 import datetime
 import os
-import pandas as pd
 import newspaper
 import feedparser
 from newspaper import Article, Config
@@ -9,8 +8,20 @@ from dateutil.parser import parse
 import pytz
 import logging
 import uuid
-
-from utils import open_vnanet_article, fix_thanhnien_title
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from utils import (
+    open_vnanet_article,
+    vnanet_resolver,
+    fix_thanhnien_title,
+    HostThrottle,
+    FeedCache,
+    get_item_guid,
+    SeenIndex,
+    HtmlArchive,
+    extract_content,
+    ArticleWriter,
+)
 
 # Setting up logging
 logging.basicConfig(
@@ -25,17 +36,49 @@ config = Config()
 config.browser_user_agent = USER_AGENT
 config.request_timeout = 20
 
+# Shared by every worker thread, limits are set from the command line in main
+throttle = HostThrottle()
+
+# Try the per-source extractors before newspaper3k, set from the command line
+use_fast_extractors = False
+
+# Number of re-parsed articles written at once when rebuilding from an archive
+ARCHIVE_BATCH_SIZE = 500
+
+# Returned by process_article_item for articles that were already scraped
+SKIPPED = "skipped"
+
+# Parser column of an article, clean_data only trims newspaper3k output
+NEWSPAPER_PARSER = "newspaper"
+FAST_PARSER = "lxml"
+
+
+def article_content_scraper(article_link, archive=None, record=None, html=None):
+    """Scrape article content from article_link, returns (content, parser)
 
-def article_content_scraper(article_link):
-    """Scrape article content from article_link"""
+    If html is given it is parsed instead of downloading article_link. If archive
+    is given, the downloaded page is stored in it together with record. With
+    use_fast_extractors, sources registered in utils.extractors skip newspaper3k
+    and parser is FAST_PARSER instead of NEWSPAPER_PARSER.
+    """
     try:
         article = Article(article_link, config=config)
-        article.download()
+        if html is None:
+            with throttle.slot(article_link):
+                article.download()
+            if archive and article.html:
+                archive.put(article_link, article.html, record)
+        else:
+            article.download(input_html=html)
+        if use_fast_extractors:
+            content = extract_content(article_link, article.html)
+            if content:
+                return content, FAST_PARSER
         article.parse()
-        return article.text
+        return article.text, NEWSPAPER_PARSER
     except newspaper.article.ArticleException as e:
         logging.error(f"Error scraping {article_link}: {e}")
-        return None
+        return None, None
 
 
 def filter_articles_in_date_range(
@@ -54,8 +97,15 @@ def filter_articles_in_date_range(
     ]
 
 
-def process_article_item(item, category, excluded_sources):
-    """Process a single article item from RSS feed"""
+def process_article_item(
+    item, category, excluded_sources, seen_index=None, archive=None
+):
+    """Process a single article item from RSS feed
+
+    If seen_index is given, articles whose URL or content was already scraped
+    are not downloaded again and SKIPPED is returned instead. If archive is
+    given, the raw page is kept in it for offline re-parsing.
+    """
     if any(source in item["link"] for source in excluded_sources):
         return None
 
@@ -73,68 +123,230 @@ def process_article_item(item, category, excluded_sources):
     if "thanhnien.vn" in article[1]:
         article[2] = fix_thanhnien_title(article[2])
 
-    content = article_content_scraper(article[1])
+    if seen_index and not seen_index.claim(article[1]):
+        return SKIPPED
+
+    record = dict(zip(["id", "url", "title", "pubDate", "category"], article))
+    content, parser = article_content_scraper(article[1], archive, record)
+    if seen_index and content and not seen_index.add(article[1], content):
+        logging.info(f"Duplicate content: {article[1]}")
+        return SKIPPED
     article.append(content if content else article[2])
+    article.append(parser)
     return article
 
 
-def scrape_rss(rss_link, category=None, start_date=None, end_date=None):
-    """Scrape all articles' links from rss_link"""
+def scrape_rss(
+    rss_link,
+    category=None,
+    start_date=None,
+    end_date=None,
+    executor=None,
+    feed_cache=None,
+    seen_index=None,
+    archive=None,
+):
+    """Scrape all articles' links from rss_link
+
+    If executor is given, articles are downloaded concurrently on it and the
+    results are collected in feed order.
+
+    If feed_cache is given, the feed is requested conditionally: a 304 response
+    skips the feed, and items already seen on the previous poll are skipped.
+    """
+    cached = feed_cache.get(rss_link) if feed_cache else {}
     try:
-        rss = feedparser.parse(rss_link)
+        with throttle.slot(rss_link):
+            rss = feedparser.parse(
+                rss_link, etag=cached.get("etag"), modified=cached.get("modified")
+            )
     except Exception as e:
         logging.error(f"Error parsing RSS feed {rss_link}: {e}")
         return [], []
 
+    if rss.get("status") == 304:
+        logging.info(f"Not modified since last poll: {rss_link}")
+        return [], []
+
     with open("docs/excluded-sources.txt", "r") as f:
         excluded_sources = f.read().splitlines()
 
     if start_date and end_date:
         rss["items"] = filter_articles_in_date_range(rss["items"], start_date, end_date)
 
+    if cached.get("guids"):
+        # Forget GUIDs that are no longer listed so the cache stays small
+        feed_guids = {get_item_guid(item) for item in rss["items"]}
+        cached["guids"] &= feed_guids
+        rss["items"] = [
+            item for item in rss["items"] if get_item_guid(item) not in cached["guids"]
+        ]
+
     logging.info(f"Collected articles: {len(rss['items'])}")
 
+    if executor:
+        futures = [
+            executor.submit(
+                process_article_item,
+                item,
+                category,
+                excluded_sources,
+                seen_index,
+                archive,
+            )
+            for item in rss["items"]
+        ]
+        results = [future.result() for future in futures]
+    else:
+        results = [
+            process_article_item(item, category, excluded_sources, seen_index, archive)
+            for item in rss["items"]
+        ]
+
     articles, err_articles = [], []
-    for item in rss["items"]:
-        processed_article = process_article_item(item, category, excluded_sources)
+    for item, processed_article in zip(rss["items"], results):
+        if processed_article is SKIPPED:
+            continue
         if processed_article:
             articles.append(processed_article)
         else:
             err_articles.append(item["link"])
 
-    return articles, err_articles
+    if feed_cache:
+        guids = {get_item_guid(item) for item in rss["items"]}
+        feed_cache.update(
+            rss_link, rss.get("etag"), rss.get("modified"), guids | cached["guids"]
+        )
 
+    return articles, err_articles
 
-def main(args):
-    files = os.listdir(args.dir)
 
-    articles, err_articles = [], []
-    for file in files:
-        with open(os.path.join(args.dir, file), "r") as f:
+def get_feeds(rss_dir):
+    """List (rss_link, category) pairs from every file in rss_dir"""
+    feeds = []
+    for file in os.listdir(rss_dir):
+        with open(os.path.join(rss_dir, file), "r") as f:
             rss_links = [rss_link.strip() for rss_link in f.readlines()]
             category = os.path.splitext(file)[0]
+            feeds.extend((rss_link, category) for rss_link in rss_links)
+    return feeds
+
+
+def parse_archived_article(archive_dir, record):
+    """Re-parse an archived page into an article row, without network"""
+    html = HtmlArchive(archive_dir).get(record["sha"])
+    content, parser = article_content_scraper(record["url"], html=html)
+    return [
+        record["id"],
+        record["url"],
+        record["title"],
+        record["pubDate"],
+        record["category"],
+        content if content else record["title"],
+        parser,
+    ]
+
+
+def set_fast_extractors(enabled):
+    global use_fast_extractors
+    use_fast_extractors = enabled
 
-            for rss_link in rss_links:
-                if args.date:
-                    logging.info(f"Scraping {rss_link} on {args.date}")
-                    args.start_date = args.date
-                    args.end_date = args.date
-                elif args.start_date and args.end_date:
-                    logging.info(
-                        f"Scraping {rss_link} from {args.start_date} to {args.end_date}"
-                    )
-                else:
-                    logging.info(f"Scraping all links {rss_link}")
-                rss_articles, rss_err_articles = scrape_rss(
-                    rss_link, category, args.start_date, args.end_date
+
+def rebuild_from_archive(
+    writer, archive_dir, start_date=None, end_date=None, workers=1, fast_extract=False
+):
+    """Rebuild article rows from the archive, keeping the latest fetch of each url"""
+    latest = {}
+    for record in HtmlArchive(archive_dir).records():
+        if start_date and end_date:
+            if not start_date <= record["pubDate"] <= end_date:
+                continue
+        latest[record["url"]] = record
+    records = [record for record in latest.values() if record["url"] not in writer.urls]
+
+    logging.info(f"Re-parsing {len(records)} archived articles")
+    with ProcessPoolExecutor(
+        workers, initializer=set_fast_extractors, initargs=(fast_extract,)
+    ) as executor:
+        articles = []
+        for article in executor.map(
+            parse_archived_article,
+            [archive_dir] * len(records),
+            records,
+            chunksize=64,
+        ):
+            articles.append(article)
+            if len(articles) >= ARCHIVE_BATCH_SIZE:
+                writer.write(articles, [])
+                articles = []
+        writer.write(articles, [])
+
+
+def scrape_feeds(writer, args):
+    """Scrape every feed listed in args.dir, writing each feed once it is finished"""
+    feed_cache = FeedCache(args.feed_cache) if args.feed_cache else None
+    seen_index = SeenIndex(args.seen_index) if args.seen_index else None
+    archive = HtmlArchive(args.archive) if args.archive else None
+    vnanet_resolver.throttle = throttle
+    if args.vnanet_cache:
+        vnanet_resolver.load(args.vnanet_cache)
+
+    # Feeds and articles run on separate pools so that a feed waiting for its
+    # articles never holds up the workers that download them
+    with ThreadPoolExecutor(args.workers) as article_executor, ThreadPoolExecutor(
+        args.feed_workers
+    ) as feed_executor:
+        futures = {}
+        for rss_link, category in get_feeds(args.dir):
+            if writer.is_done(rss_link):
+                logging.info(f"Already scraped, skipping {rss_link}")
+                continue
+            if args.date:
+                logging.info(f"Scraping {rss_link} on {args.date}")
+            elif args.start_date and args.end_date:
+                logging.info(
+                    f"Scraping {rss_link} from {args.start_date} to {args.end_date}"
                 )
-                articles.extend(rss_articles)
-                err_articles.extend(rss_err_articles)
+            else:
+                logging.info(f"Scraping all links {rss_link}")
+            future = feed_executor.submit(
+                scrape_rss,
+                rss_link,
+                category,
+                args.start_date,
+                args.end_date,
+                article_executor,
+                feed_cache,
+                seen_index,
+                archive,
+            )
+            futures[future] = rss_link
+
+        for future in as_completed(futures):
+            rss_link = futures.pop(future)
+            rss_articles, rss_err_articles = future.result()
+            writer.write(rss_articles, rss_err_articles, rss_link)
+
+            # Only remember what was polled once it is safely written
+            if seen_index:
+                seen_index.commit(article[1] for article in rss_articles)
+            if feed_cache:
+                feed_cache.commit(rss_link)
+                feed_cache.save()
+            vnanet_resolver.save()
+
+    if seen_index:
+        seen_index.close()
 
-    df = pd.DataFrame(
-        articles, columns=["id", "url", "title", "pubDate", "category", "content"]
-    )
-    df = df.drop_duplicates(subset=["url"])
+
+def main(args):
+    throttle.per_host = args.per_host
+    throttle.delay = args.delay
+    set_fast_extractors(args.fast_extract)
+
+    if args.date:
+        args.start_date = args.date
+        args.end_date = args.date
 
     if not os.path.exists(args.output):
         os.makedirs(args.output)
@@ -146,10 +358,29 @@ def main(args):
     else:
         file_name = "articles.csv"
 
-    df.to_csv(os.path.join(args.output, file_name), index=False)
+    # Articles are appended as they are finished, if a checkpoint of an
+    # interrupted run exists, the run is resumed. Conditional polling and the
+    # seen index only return new articles, so their runs add to the existing
+    # output.
+    writer = ArticleWriter(
+        os.path.join(args.output, file_name),
+        os.path.join(args.output, "error-articles.txt"),
+        append=bool(args.feed_cache or args.seen_index),
+    )
+
+    if args.from_archive:
+        rebuild_from_archive(
+            writer,
+            args.from_archive,
+            args.start_date,
+            args.end_date,
+            args.workers,
+            args.fast_extract,
+        )
+    else:
+        scrape_feeds(writer, args)
 
-    with open(os.path.join(args.output, "error-articles.txt"), "w") as f:
-        f.writelines(err_article + "\n" for err_article in err_articles)
+    writer.close()
 
 
 if __name__ == "__main__":
@@ -167,6 +398,52 @@ if __name__ == "__main__":
         "--start-date", help="Start date for article scraping (YYYY-MM-DD)"
     )
     parser.add_argument("--end-date", help="End date for article scraping (YYYY-MM-DD)")
+    parser.add_argument(
+        "--workers", type=int, default=16, help="Number of concurrent article downloads"
+    )
+    parser.add_argument(
+        "--feed-workers",
+        type=int,
+        default=8,
+        help="Number of feeds parsed concurrently",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent requests to a single host",
+    )
+    parser.add_argument(
+        "--delay",
+        type=float,
+        default=0.25,
+        help="Minimum delay in seconds between two requests to the same host",
+    )
+    parser.add_argument(
+        "--feed-cache",
+        help="Path to a JSON cache of ETag/Last-Modified per feed, "
+        "enables conditional polling",
+    )
+    parser.add_argument(
+        "--seen-index",
+        help="Path to a SQLite index of scraped URLs, only unseen articles are "
+        "downloaded",
+    )
+    parser.add_argument(
+        "--vnanet-cache", help="Path to a JSON cache of resolved vnanet links"
+    )
+    parser.add_argument(
+        "--archive", help="Directory to keep a compressed copy of every fetched page"
+    )
+    parser.add_argument(
+        "--from-archive",
+        help="Rebuild the output from an archive directory instead of the network",
+    )
+    parser.add_argument(
+        "--fast-extract",
+        action="store_true",
+        help="Use the per-source lxml extractors, newspaper3k is the fallback",
+    )
     args = parser.parse_args()
 
     # Start date and end date must be specified together
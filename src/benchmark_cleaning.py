@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import os
+import re
+import time
+
+import pandas as pd
+
+from utils import (
+    clean_vtv_text,
+    clean_plo_text,
+    clean_vtc_text,
+    clean_laodong_text,
+    clean_frame,
+)
+
+
+def clean_unnecessary_text(text):
+    """Unnecessary text can be author, image source, etc."""
+    # List of patterns of image source to remove
+    patterns = [
+        r"\(Ảnh:.*?\)",  # (Ảnh: VTV)
+        r"\(Ảnh minh hoạ:.*?\)",  # (Ảnh minh hoạ: VTV)
+        r"\(Ảnh minh họa:.*?\)",
+        r"\(Nguồn:.*?\)",
+        r"\(Nguồn ảnh:.*?\)",
+        r"\(Nguồn video:.*?\)",
+        r"Ảnh: [AĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴA-Z\s]*\b",  # Ảnh: PHƯƠNG UYÊN
+        r"Đồ họa: [AĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴA-Z\s]*\b",
+        r"ẢNH CHỤP MÀN HÌNH [AĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴA-Z\s]*\b",
+    ]
+
+    for pattern in patterns:
+        text = re.sub(pattern, "", text)
+
+    # Remove image source sentences, which start with "Ảnh: " or "Đồ họa: ", etc.
+    sentences = text.split(". ")
+    patterns = [
+        r"Ảnh:.*",
+        r"Đồ họa:.*",
+        r"Ảnh minh hoạ:.*",
+        r"Ảnh minh họa:.*",
+        r"Video:.*",
+        r"Nguồn:.*",
+    ]
+    for pattern in patterns:
+        sentences = [
+            sentence for sentence in sentences if not re.match(pattern, sentence)
+        ]
+    text = ". ".join(sentences)
+
+    # Clean sentences with all uppercase characters (usually author)
+    sentences = text.split(".")
+    sentences = [sentence for sentence in sentences if not sentence.isupper()]
+    text = ".".join(sentences)
+
+    # Clean sentences with 2 or less words, excluding words inside parentheses (usually author)
+    sentences = text.split(".")
+    clean_sentences = []
+    for sentence in sentences:
+        if len(re.sub(r"\(.*?\)", "", sentence).split()) > 3:
+            clean_sentences.append(sentence)
+
+    text = ".".join(clean_sentences)
+
+    return text
+
+
+def clean_text(text):
+    """Clean scraped text, as clean_data.clean_text did it before utils.cleaning"""
+    text = text.replace("BNEWS", " ")
+
+    # text = text.replace("\n", " ")
+    # text = text.replace("\t", " ")
+    # text = text.replace("\r", " ")
+
+    # Remove line breaks, check if the line before line break is a full stop, if not, add a full stop
+    lines = text.splitlines(True)  # keep line breaks in list
+    lines = [line for line in lines if line.strip()]  # remove empty lines
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line.endswith("."):
+            line += "."
+        lines[i] = line
+    text = " ".join(lines)
+
+    # Remove any words that contains "/TTXVN"
+    words = text.split(" ")
+    words = [word for word in words if "/TTXVN" not in word]
+    text = " ".join(words)
+
+    # Clean image source
+    text = clean_unnecessary_text(text)
+
+    # Strip leading and trailing spaces
+    text = text.strip()
+
+    print(text)
+
+    return text
+
+
+def legacy_clean_frame(df):
+    """
+    Cleaning as clean_data.main did it before utils.cleaning.
+    """
+    for domain, cleaner in [
+        ("vtv.vn", clean_vtv_text),
+        ("plo.vn", clean_plo_text),
+        ("vtc.vn", clean_vtc_text),
+        ("laodong.vn", clean_laodong_text),
+    ]:
+        mask = df["url"].str.contains(domain)
+        df.loc[mask, "content"] = df.loc[mask, "content"].apply(cleaner)
+
+    # clean_text prints every article, keep it out of the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        df["content"] = df["content"].apply(clean_text)
+
+    df["content"] = df["content"].fillna(df["title"])
+    return df
+
+
+def main(args):
+    """
+    Compare the throughput of the legacy and compiled cleaning.
+    """
+    df = pd.read_csv(args.input, nrows=args.limit or None)
+    df = df[df["content"].notna()].reset_index(drop=True)
+    # The legacy path trims every source, compare on newspaper3k output only
+    if "parser" in df:
+        df = df[df["parser"] != "lxml"].drop(columns="parser").reset_index(drop=True)
+
+    timings = {}
+    results = {}
+    for name, clean in [("legacy", legacy_clean_frame), ("compiled", clean_frame)]:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[name] = clean(df.copy())
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    for name, seconds in timings.items():
+        print(f"{name:<10}{len(df) / seconds:>12.1f} articles/s")
+    print(f"speedup   {timings['legacy'] / timings['compiled']:>12.1f}x")
+
+    same = results["legacy"]["content"].equals(results["compiled"]["content"])
+    print("identical output:", same)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark text cleaning in articles per second"
+    )
+    parser.add_argument("-i", "--input", help="Path to articles csv", required=True)
+    parser.add_argument(
+        "-n", "--limit", type=int, default=0, help="Maximum number of articles"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="Runs per implementation"
+    )
+    args = parser.parse_args()
+    main(args)
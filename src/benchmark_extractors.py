@@ -0,0 +1,81 @@
+import argparse
+import difflib
+import time
+from collections import defaultdict
+
+from newspaper import Article
+
+from article_scraper import config
+from utils import HtmlArchive, extract_content, get_extractor, get_host
+
+
+def newspaper_extract(url, html):
+    article = Article(url, config=config)
+    article.download(input_html=html)
+    article.parse()
+    return article.text
+
+
+def main(args):
+    """
+    Compare the per-source extractors with newspaper3k on archived pages.
+    """
+    archive = HtmlArchive(args.archive)
+    stats = defaultdict(lambda: defaultdict(float))
+
+    pages = 0
+    for record in archive.records():
+        if get_extractor(record["url"]) is None:
+            continue
+        if args.limit and pages >= args.limit:
+            break
+        pages += 1
+
+        html = archive.get(record["sha"])
+        source = stats[get_host(record["url"])]
+
+        start = time.perf_counter()
+        baseline = newspaper_extract(record["url"], html)
+        source["newspaper_time"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = extract_content(record["url"], html)
+        source["fast_time"] += time.perf_counter() - start
+
+        source["pages"] += 1
+        if fast is None:
+            source["fallbacks"] += 1
+        else:
+            source["similarity"] += difflib.SequenceMatcher(
+                None, baseline, fast, autojunk=False
+            ).ratio()
+
+    print(
+        f"{'source':<16}{'pages':>7}{'newspaper ms':>14}{'fast ms':>10}"
+        f"{'speedup':>9}{'fallback':>10}{'similarity':>12}"
+    )
+    for host, source in sorted(stats.items()):
+        n = source["pages"]
+        extracted = n - source["fallbacks"]
+        newspaper_ms = source["newspaper_time"] / n * 1000
+        fast_ms = source["fast_time"] / n * 1000
+        similarity = source["similarity"] / extracted if extracted else 0.0
+        print(
+            f"{host:<16}{int(n):>7}{newspaper_ms:>14.2f}{fast_ms:>10.2f}"
+            f"{newspaper_ms / max(fast_ms, 1e-9):>8.1f}x"
+            f"{source['fallbacks'] / n:>10.1%}{similarity:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark per-source extractors against newspaper3k"
+    )
+    parser.add_argument(
+        "-a", "--archive", help="Path to an html archive", required=True
+    )
+    parser.add_argument(
+        "-n", "--limit", type=int, default=0, help="Maximum number of pages"
+    )
+    args = parser.parse_args()
+    main(args)
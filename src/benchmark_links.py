@@ -0,0 +1,93 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import aggregate_links, get_link_articles
+
+
+def legacy_process_links(df_link):
+    """
+    Row-wise link processing as ner_run.process_links did it before
+    utils.link_aggregation.
+    """
+    df_link["from_to"] = df_link.apply(
+        lambda x: " ".join(map(str, sorted([x["from"], x["to"]]))), axis=1
+    )
+    df_link.drop_duplicates(subset=["from_to", "article_ids"], inplace=True)
+    df_link.drop("from_to", axis=1, inplace=True)
+
+    df_link = (
+        df_link.groupby(["from", "to"])
+        .agg({"article_ids": lambda x: list(x)})
+        .reset_index()
+    )
+    df_link["weight"] = df_link["article_ids"].apply(len)
+    return df_link
+
+
+def get_pairs(num_pairs, num_entities, num_articles, seed=1):
+    """
+    Random co-occurrences, entities follow a Zipf law like names in the news.
+    """
+    rng = np.random.default_rng(seed)
+    fr = (rng.zipf(1.3, num_pairs) - 1) % num_entities
+    to = (rng.zipf(1.3, num_pairs) - 1) % num_entities
+    article = np.sort(rng.integers(0, num_articles, num_pairs))
+    return fr.astype(np.int32), to.astype(np.int32), article.astype(np.int32)
+
+
+def main(args):
+    """
+    Compare the throughput of the legacy and vectorized link aggregation.
+    """
+    fr, to, article = get_pairs(args.pairs, args.entities, args.articles)
+
+    start = time.perf_counter()
+    links = aggregate_links(fr, to, article)
+    vectorized = time.perf_counter() - start
+    print(f"vectorized{args.pairs / vectorized:>14.0f} pairs/s, {len(links[0])} links")
+
+    # The row-wise version is far too slow for the full set
+    n = min(args.pairs, args.legacy_pairs)
+    df_link = pd.DataFrame({"from": fr[:n], "to": to[:n], "article_ids": article[:n]})
+    start = time.perf_counter()
+    legacy_process_links(df_link)
+    legacy = time.perf_counter() - start
+    print(f"legacy    {n / legacy:>14.0f} pairs/s on {n} pairs")
+    print(f"speedup   {(args.pairs / vectorized) / (n / legacy):>14.1f}x")
+
+    # Weights must count the distinct articles of each unordered pair
+    lo, hi = np.minimum(fr[:n], to[:n]), np.maximum(fr[:n], to[:n])
+    expected = len(set(zip(lo.tolist(), hi.tolist(), article[:n].tolist())))
+    _, _, weight, _, _ = aggregate_links(fr[:n], to[:n], article[:n])
+    print("weights match:", int(weight.sum()) == expected)
+
+    # No pairs at all, e.g. an incremental run without new articles
+    empty = np.empty(0, dtype=np.int32)
+    _, _, weight, offsets, articles = aggregate_links(empty, empty, empty)
+    print("empty input:", len(weight) == 0 and get_link_articles(offsets, articles) == [])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark link aggregation in entity pairs per second"
+    )
+    parser.add_argument(
+        "-n", "--pairs", type=int, default=10_000_000, help="Number of raw pairs"
+    )
+    parser.add_argument(
+        "--entities", type=int, default=200_000, help="Number of distinct entities"
+    )
+    parser.add_argument(
+        "--articles", type=int, default=100_000, help="Number of articles"
+    )
+    parser.add_argument(
+        "--legacy-pairs",
+        type=int,
+        default=200_000,
+        help="Number of pairs the row-wise version runs on",
+    )
+    args = parser.parse_args()
+    main(args)
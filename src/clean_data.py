@@ -1,170 +1,47 @@
 import argparse
 import pandas as pd
-import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+from utils import clean_frame
 
-def clean_plo_text(text):
-    # Remove the last line
-    text = text.rsplit("\n", 1)[0]
 
-    # Remove any 'PLO'
-    text = text.replace("(PLO)-", "")
+def clean_in_chunks(input_path, output_path, workers, chunksize):
+    """
+    Stream input_path in chunks and clean them in a process pool.
 
-    return text
+    At most 2 chunks per worker are in flight and chunks are written in input
+    order, so the output is the same as cleaning the whole file at once.
+    """
+    # Header first, so an input without rows gives the same output as main
+    columns = pd.read_csv(input_path, nrows=0).columns
+    pd.DataFrame(columns=columns).to_csv(output_path, index=False)
 
+    chunks = pd.read_csv(input_path, dtype=str, chunksize=chunksize)
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(clean_frame, chunk))
+            if len(pending) >= 2 * workers:
+                write_chunk(pending.popleft().result(), output_path)
+        while pending:
+            write_chunk(pending.popleft().result(), output_path)
 
-def clean_vtc_text(text):
-    if "\n" not in text:
-        return text
 
-    # Remove the first line
-    text = text.split("\n", 1)[1]
-
-    # Remove the last line
-    text = text.rsplit("\n", 1)[0]
-
-    return text
-
-
-def clean_laodong_text(text):
-    if "\n" not in text:
-        return text
-
-    # Remove the first line
-    text = text.split("\n", 1)[1]
-
-    return text
-
-
-def clean_vtv_text(text):
-    if "\n" not in text:
-        return text
-
-    # Remove the first line
-    text = text.split("\n", 1)[1]
-
-    # Remove the last line
-    text = text.rsplit("\n", 1)[0]
-
-    # Remove any 'VTV.vn'
-    text = text.replace("VTV.vn", "")
-
-    return text
-
-
-def clean_unnecessary_text(text):
-    """Unnecessary text can be author, image source, etc."""
-    # List of patterns of image source to remove
-    patterns = [
-        r"\(Ảnh:.*?\)",  # (Ảnh: VTV)
-        r"\(Ảnh minh hoạ:.*?\)",  # (Ảnh minh hoạ: VTV)
-        r"\(Ảnh minh họa:.*?\)",
-        r"\(Nguồn:.*?\)",
-        r"\(Nguồn ảnh:.*?\)",
-        r"\(Nguồn video:.*?\)",
-        r"Ảnh: [AĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴA-Z\s]*\b",  # Ảnh: PHƯƠNG UYÊN
-        r"Đồ họa: [AĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴA-Z\s]*\b",
-        r"ẢNH CHỤP MÀN HÌNH [AĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴAĂÂÁẮẤÀẰẦẢẲẨÃẴẪẠẶẬĐEÊÉẾÈỀẺỂẼỄẸỆIÍÌỈĨỊOÔƠÓỐỚÒỒỜỎỔỞÕỖỠỌỘỢUƯÚỨÙỪỦỬŨỮỤỰYÝỲỶỸỴA-Z\s]*\b",
-    ]
-
-    for pattern in patterns:
-        text = re.sub(pattern, "", text)
-
-    # Remove image source sentences, which start with "Ảnh: " or "Đồ họa: ", etc.
-    sentences = text.split(". ")
-    patterns = [
-        r"Ảnh:.*",
-        r"Đồ họa:.*",
-        r"Ảnh minh hoạ:.*",
-        r"Ảnh minh họa:.*",
-        r"Video:.*",
-        r"Nguồn:.*",
-    ]
-    for pattern in patterns:
-        sentences = [
-            sentence for sentence in sentences if not re.match(pattern, sentence)
-        ]
-    text = ". ".join(sentences)
-
-    # Clean sentences with all uppercase characters (usually author)
-    sentences = text.split(".")
-    sentences = [sentence for sentence in sentences if not sentence.isupper()]
-    text = ".".join(sentences)
-
-    # Clean sentences with 2 or less words, excluding words inside parentheses (usually author)
-    sentences = text.split(".")
-    clean_sentences = []
-    for sentence in sentences:
-        if len(re.sub(r"\(.*?\)", "", sentence).split()) > 3:
-            clean_sentences.append(sentence)
-
-    text = ".".join(clean_sentences)
-
-    return text
-
-
-def clean_text(text):
-    """Clean scraped text"""
-    text = text.replace("BNEWS", " ")
-
-    # text = text.replace("\n", " ")
-    # text = text.replace("\t", " ")
-    # text = text.replace("\r", " ")
-
-    # Remove line breaks, check if the line before line break is a full stop, if not, add a full stop
-    lines = text.splitlines(True)  # keep line breaks in list
-    lines = [line for line in lines if line.strip()]  # remove empty lines
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if not line.endswith("."):
-            line += "."
-        lines[i] = line
-    text = " ".join(lines)
-
-    # Remove any words that contains "/TTXVN"
-    words = text.split(" ")
-    words = [word for word in words if "/TTXVN" not in word]
-    text = " ".join(words)
-
-    # Clean image source
-    text = clean_unnecessary_text(text)
-
-    # Strip leading and trailing spaces
-    text = text.strip()
-
-    print(text)
-
-    return text
+def write_chunk(df, output_path):
+    df.to_csv(output_path, mode="a", header=False, index=False)
 
 
 def main(args):
-    df = pd.read_csv(args.input)
-
-    # Clean VTV.vn text
-    df.loc[df["url"].str.contains("vtv.vn"), "content"] = df.loc[
-        df["url"].str.contains("vtv.vn"), "content"
-    ].apply(clean_vtv_text)
+    if args.workers > 1 or args.chunksize:
+        clean_in_chunks(args.input, args.output, args.workers, args.chunksize or 1000)
+        return
 
-    # Clean PLO text
-    df.loc[df["url"].str.contains("plo.vn"), "content"] = df.loc[
-        df["url"].str.contains("plo.vn"), "content"
-    ].apply(clean_plo_text)
+    # Everything is read as text so that chunked mode gives the same output
+    df = pd.read_csv(args.input, dtype=str)
 
-    # Clean VTC text
-    df.loc[df["url"].str.contains("vtc.vn"), "content"] = df.loc[
-        df["url"].str.contains("vtc.vn"), "content"
-    ].apply(clean_vtc_text)
-
-    # Clean laodong text
-    df.loc[df["url"].str.contains("laodong.vn"), "content"] = df.loc[
-        df["url"].str.contains("laodong.vn"), "content"
-    ].apply(clean_laodong_text)
-
-    # Clean all text
-    df["content"] = df["content"].apply(clean_text)
-
-    # Fill NaN values with title
-    df["content"] = df["content"].fillna(df["title"])
+    # Clean source specific boilerplate, then all text
+    df = clean_frame(df)
 
     df.to_csv(args.output, index=False)
 
@@ -186,5 +63,18 @@ if __name__ == "__main__":
         required=True,
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes cleaning chunks in parallel",
+    )
+
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="Number of rows per chunk, streams the input when set",
+    )
+
     args = parser.parse_args()
     main(args)
@@ -1,29 +1,49 @@
 import argparse
-import networkx as nx
+import logging
 import pandas as pd
 
+from utils import load_graph, compute_scores, betweenness_centrality, get_num_samples
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Output column of every score
+SCORE_COLUMNS = {
+    'score': 'eigenvector',
+    'score_pagerank': 'pagerank',
+    'score_degree': 'degree',
+    'score_betweenness': 'betweenness',
+}
 
-def main(args):
-    G = nx.Graph()
 
-    df_link = pd.read_csv(args.directory + "link.csv")
+def get_warm_start(path, nodes):
+    """
+    Eigenvector scores of a previous ner.csv for nodes, new nodes get the mean.
+    """
+    previous = pd.read_csv(path, usecols=['id', 'score']).set_index('id')['score']
+    nstart = previous.reindex(nodes)
+    return nstart.fillna(previous.mean()).fillna(1.0).values
+
+
+def main(args):
+    graph = load_graph(args.directory + "link.csv", cache=not args.no_cache)
+    adjacency, nodes = graph.adjacency, graph.nodes
     df_ner = pd.read_csv(args.directory + "ner.csv")
 
-    # Add edges and weights
-    for index, row in df_link.iterrows():
-        G.add_edge(row['from'], row['to'], weight=row['weight'])
+    nstart = get_warm_start(args.warm_start, nodes) if args.warm_start else None
+    scores = compute_scores(adjacency, tol=args.tol, nstart=nstart)
 
-    nodes = []
-    eigenvector_cents = []
-    ec_dict = nx.eigenvector_centrality(G, max_iter=1000, weight='weight')
-    for node in G.nodes():
-        nodes.append(node)
-        eigenvector_cents.append(ec_dict[node])
-    centrality_map = {}
-    for n, c in zip(nodes, eigenvector_cents):
-        centrality_map[n] = c
+    # Exact betweenness is O(VE), estimate it from sampled sources
+    if args.betweenness:
+        k = get_num_samples(len(nodes), args.epsilon, args.delta)
+        logging.info(f"Betweenness from {k} of {len(nodes)} sources")
+        scores['betweenness'] = betweenness_centrality(
+            adjacency, k=k, seed=args.seed, workers=args.workers)
 
-    df_ner['score'] = df_ner['id'].apply(lambda x: centrality_map.get(x, 0.0))
+    for column, name in SCORE_COLUMNS.items():
+        if name not in scores:
+            continue
+        score_map = pd.Series(scores[name], index=nodes)
+        df_ner[column] = df_ner['id'].map(score_map).fillna(0.0)
 
     df_ner.to_csv(args.directory + "ner.csv", index=False)
 
@@ -32,5 +52,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Compute betweenness centrality score for each entity')
     parser.add_argument('-d', '--directory', help='Path to directory containing link and ner csv files',
                         default='data/')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not reuse or save the graph cache next to link.csv')
+    parser.add_argument('--tol', type=float, default=1e-6,
+                        help='Convergence tolerance of the power iterations')
+    parser.add_argument('--warm-start',
+                        help='Path to a previous ner.csv whose scores start the eigenvector iteration')
+    parser.add_argument('--betweenness', action='store_true',
+                        help='Also write the approximate betweenness centrality to score_betweenness')
+    parser.add_argument('--epsilon', type=float, default=0.05,
+                        help='Maximum error of the normalized betweenness')
+    parser.add_argument('--delta', type=float, default=0.1,
+                        help='Probability that the betweenness error exceeds epsilon')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes computing shortest paths')
+    parser.add_argument('--seed', type=int, help='Seed of the sampled sources')
     args = parser.parse_args()
     main(args)
@@ -1,33 +1,150 @@
+import argparse
+import gzip
+import json
+import logging
+import os
 import random
 import pandas as pd
-from src.find_clique import *
-
-data_link1 = pd.read_csv('data/ner_new.csv',encoding ='utf-8')
-df_link = pd.read_csv("data/link_new.csv", index_col="id")
-cliques = get_all_cliques(df_link)
-cluster_map = {}
-centrality_map = get_graph_centralities(get_graph_from_link(df_link))
-for i in range(len(cliques)):
-    for n in cliques[i]:
-        cluster_map[n] = i
-data_link1['cluster'] = data_link1['key'].apply(lambda x: cluster_map.get(x, -1))
-data_link1['size'] = data_link1['key'].apply(lambda x: centrality_map.get(x, 0.0))
-# Create a columns 'x' and set the value to math.random(int)
-data_link1['x'] = data_link1['key'].apply(lambda x: random.randint(0, 100))
-data_link1['y'] = data_link1['key'].apply(lambda x: random.randint(0, 100))
-nodes = data_link1.to_dict('records')
-
-# Xử lý link.csv
-data_link = pd.read_csv('link.csv',encoding ='utf-8')
-# retieve 2 columns from and to in data_link
-data_link = data_link[['from','to']]
-# get the list of nodes
-edges =  data_link.values.tolist()
+from find_clique import get_graph_cliques
+from utils import load_graph, eigenvector_centrality, layout_graph
 
-import pandas as pd
-import json 
-# write json have the following structure
-def write_json(data,data1,filename):
-    with open(filename, 'w',encoding='utf-8') as f:
-        json.dump({'nodes':data,"edges":data1,"clusters":[{ "key": "0", "color": "#6c3e81", "clusterLabel": "All nodes" }],"tags":[{ "key": "ORG", "image": "organization.svg" },{ "key": "PER", "image": "person.svg" },{ "key": "LOC", "image": "unknown.svg" }]}, f,indent=4,ensure_ascii=False)
-write_json(nodes,edges, 'graph.json')
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+CLUSTERS = [{"key": "0", "color": "#6c3e81", "clusterLabel": "All nodes"}]
+TAGS = [
+    {"key": "ORG", "image": "organization.svg"},
+    {"key": "PER", "image": "person.svg"},
+    {"key": "LOC", "image": "unknown.svg"},
+]
+
+# Links are read and written this many rows at a time
+EDGE_CHUNK_SIZE = 100_000
+
+
+def open_json(path, mode):
+    # Gzipped if the file name ends with .gz
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def load_positions(path):
+    """
+    Node positions of a previous graph.json, an empty dict if there is none.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open_json(path, 'r') as f:
+        return {n['key']: (n['x'], n['y']) for n in json.load(f)['nodes'] if 'x' in n}
+
+
+def get_nodes(df_ner, graph, previous, method='louvain', iterations=100):
+    """
+    Nodes with their cluster, size and position. Positions are laid out here
+    instead of in the browser, from the previous positions so that only new
+    nodes move much.
+    """
+    cluster_map = {}
+    for i, clique in enumerate(get_graph_cliques(graph, method)):
+        for n in clique:
+            cluster_map[n] = i
+    centrality_map = dict(zip(graph.nodes, eigenvector_centrality(graph.adjacency)))
+
+    positions = previous.copy()
+    layout = layout_graph(graph.adjacency, graph.nodes, previous, iterations, seed=0)
+    positions.update(zip(graph.nodes, layout.round(2).tolist()))
+    # Nodes without links are scattered over the layout
+    xs, ys = zip(*positions.values()) if positions else ((0, 100), (0, 100))
+    for key in df_ner['key']:
+        if key not in positions:
+            positions[key] = (round(random.uniform(min(xs), max(xs)), 2),
+                              round(random.uniform(min(ys), max(ys)), 2))
+
+    df_ner['cluster'] = df_ner['key'].apply(lambda x: cluster_map.get(x, -1))
+    df_ner['size'] = df_ner['key'].apply(lambda x: centrality_map.get(x, 0.0))
+    df_ner['x'] = df_ner['key'].apply(lambda x: positions[x][0])
+    df_ner['y'] = df_ner['key'].apply(lambda x: positions[x][1])
+    return df_ner
+
+
+def iter_edges(link_path, keys=None):
+    """
+    [from, to] of every link, only those between keys if given, read in chunks.
+    """
+    for chunk in pd.read_csv(link_path, usecols=['from', 'to'], chunksize=EDGE_CHUNK_SIZE):
+        if keys is not None:
+            chunk = chunk[chunk['from'].isin(keys) & chunk['to'].isin(keys)]
+        yield from chunk.values.tolist()
+
+
+def write_json(nodes, edges, filename):
+    """
+    Stream nodes and edges into a compact graph.json, gzipped if filename ends
+    with .gz, without building the whole document in memory.
+    """
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    with open_json(filename, 'w') as f:
+        for name, items in [('nodes', nodes), ('edges', edges)]:
+            f.write('{' if name == 'nodes' else ',')
+            f.write(f'"{name}":[')
+            for i, item in enumerate(items):
+                if i:
+                    f.write(',')
+                f.write(dumps(item))
+            f.write(']')
+        f.write(f',"clusters":{dumps(CLUSTERS)},"tags":{dumps(TAGS)}}}')
+
+
+def iter_records(df, chunk_size=10_000):
+    # Rows as dicts of Python values, a chunk at a time
+    for start in range(0, len(df), chunk_size):
+        yield from df.iloc[start:start + chunk_size].to_dict('records')
+
+
+def get_tier_path(path, size):
+    # graph.json -> graph_top500.json, graph.json.gz -> graph_top500.json.gz
+    gz = '.gz' if path.endswith('.gz') else ''
+    base, ext = os.path.splitext(path[:len(path) - len(gz)])
+    return f'{base}_top{size}{ext}{gz}'
+
+
+def main(args):
+    df_ner = pd.read_csv(args.ner, encoding='utf-8')
+    # Built once, and reused from its cache by the next run
+    graph = load_graph(args.link)
+    previous = load_positions(args.previous or args.output)
+
+    df_nodes = get_nodes(df_ner, graph, previous, args.method, args.iterations)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    edge_path = args.edges or args.link
+    write_json(iter_records(df_nodes), iter_edges(edge_path), args.output)
+    logging.info(f"Wrote {len(df_nodes)} nodes to {args.output}")
+
+    # Level-of-detail tiers, the top nodes by size and the edges between them
+    for size in args.lod:
+        df_top = df_nodes.nlargest(size, 'size')
+        path = get_tier_path(args.output, size)
+        write_json(iter_records(df_top), iter_edges(edge_path, set(df_top['key'])), path)
+        logging.info(f"Wrote {len(df_top)} nodes to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the entity graph to graph.json for the web client')
+    parser.add_argument('--ner', help='Path to nodes csv file with key, label and tag columns',
+                        default='data/ner_new.csv')
+    parser.add_argument('--link', help='Path to link csv file the graph is built from',
+                        default='data/link_new.csv')
+    parser.add_argument('--edges', help='Path to link csv file of the exported edges, --link by default')
+    parser.add_argument('-o', '--output', help='Path to output json file, gzipped if it ends with .gz',
+                        default='graph.json')
+    parser.add_argument('--previous', help='Path to the previous graph.json to start the layout from, '
+                        '--output by default')
+    parser.add_argument('--lod', type=lambda s: [int(n) for n in s.split(',') if n], default=[],
+                        help='Comma separated sizes of level-of-detail files with the top nodes by size')
+    parser.add_argument('-m', '--method', choices=['louvain', 'label_propagation'], default='louvain',
+                        help='Community detection method of the clusters')
+    parser.add_argument('--iterations', type=int, default=100, help='Number of layout iterations')
+    args = parser.parse_args()
+    main(args)
@@ -1,9 +1,10 @@
 import argparse
 import pandas as pd
 import networkx as nx
-from tqdm import tqdm
 import matplotlib.pyplot as plt
-from networkx.algorithms.community.kclique import k_clique_communities
+
+from utils import (eigenvector_centrality, EntityGraph, detect_communities,
+                   get_membership_index, get_community_adjacency)
 
 WEIGHT_THRESHOLD=6
 CLIQUE_SIZE_THRESHOLD=7
@@ -17,54 +18,48 @@ def get_link_with_weight(df_link_):
     return df_link
 
 def get_graph_from_link(df_wlink):
-    G = nx.Graph()
-    for link in tqdm(df_wlink.index):
-        G.add_edge(df_wlink.iloc[link]['from'],
-                   df_wlink.iloc[link]['to'],
-                   weight=df_wlink.iloc[link]['weight'])
-    return G
+    return EntityGraph.from_links(df_wlink).to_networkx()
 
 def get_graph_centralities(G):
     # Centrality
-    nodes = []
-    eigenvector_cents = []
-    ec_dict = nx.eigenvector_centrality(G, max_iter=1000, weight='weight')
-    for node in tqdm(G.nodes()):
-        nodes.append(node)
-        eigenvector_cents.append(ec_dict[node])
-    centrality_map = {}
-    for n, c in zip(nodes, eigenvector_cents):
-        centrality_map[n] = c
-    return centrality_map
+    adjacency = nx.to_scipy_sparse_array(G, weight='weight', format='csr')
+    return dict(zip(G.nodes(), eigenvector_centrality(adjacency)))
+
+def get_graph_communities(graph, method='louvain'):
+    # Community of every node, -1 in communities under CLIQUE_SIZE_THRESHOLD nodes
+    return detect_communities(graph.adjacency, method, CLIQUE_SIZE_THRESHOLD, seed=0)
+
+def get_communities(df_wlink, method='louvain'):
+    graph = EntityGraph.from_links(df_wlink)
+    return graph.adjacency, graph.nodes, get_graph_communities(graph, method)
+
+def get_graph_cliques(graph, method='louvain'):
+    nodes, labels = graph.nodes, get_graph_communities(graph, method)
+    members, offsets = get_membership_index(labels)
+    return [set(nodes[members[offsets[c]:offsets[c + 1]]]) for c in range(len(offsets) - 1)]
 
-def get_all_cliques(df_wlink):
-    G = get_graph_from_link(df_wlink)
-    return list(k_clique_communities(G, CLIQUE_SIZE_THRESHOLD))
+def get_all_cliques(df_wlink, method='louvain'):
+    return get_graph_cliques(EntityGraph.from_links(df_wlink), method)
 
-def get_clique_graph_from_link(df_wlink, clique):
-    # print(clique)
-    cG = nx.Graph()
-    for link in tqdm(df_wlink.index):
-        f = df_wlink.iloc[link]['from']
-        t = df_wlink.iloc[link]['to']
-        w = df_wlink.iloc[link]['weight']
-        if f in clique and t in clique:
-            cG.add_edge(f, t, weight=w)
-    return cG
+def get_clique_graph_from_link(adjacency, nodes, members, offsets, cluster):
+    # Subgraph of a community from the membership index
+    sub, sub_nodes = get_community_adjacency(adjacency, members, offsets, cluster)
+    cG = nx.from_scipy_sparse_array(sub)
+    return nx.relabel_nodes(cG, dict(enumerate(nodes[sub_nodes])))
 
 def main(args):
     df_link = pd.read_csv(args.directory + "link.csv", index_col="id")
     df_wlink = get_link_with_weight(df_link)
-    cliques = get_all_cliques(df_wlink)
-    cluster_map = {}
-    for i in range(len(cliques)):
-        for n in cliques[i]:
-            cluster_map[n] = i
+    _, nodes, labels = get_communities(df_wlink, args.method)
+    cluster_map = {n: c for n, c in zip(nodes, labels.tolist()) if c >= 0}
     print(cluster_map)
         
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Find and output clique')
     parser.add_argument('-d', '--directory', help='Path to directory containing link and ner csv files',
                         default='docs/ner/')
+    parser.add_argument('-m', '--method', choices=['louvain', 'label_propagation'],
+                        default='louvain',
+                        help='Community detection method, label propagation is faster')
     args = parser.parse_args()
     main(args)
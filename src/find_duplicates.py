@@ -0,0 +1,58 @@
+import argparse
+import logging
+
+import pandas as pd
+
+from utils import find_near_duplicates
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+def get_duplicate_groups(df, threshold):
+    """
+    Group near-identical articles, wire stories republished by several outlets.
+
+    Returns a DataFrame with the id of every article that has near-duplicates
+    and the group_id of its group, which is the id of the first article of it.
+    """
+    texts = df["content"].fillna(df["title"]).fillna("").astype(str).tolist()
+    representatives = find_near_duplicates(texts, threshold=threshold)
+
+    df_groups = pd.DataFrame(
+        {"id": df["id"], "group_id": df["id"].iloc[representatives].values}
+    )
+    group_sizes = df_groups["group_id"].map(df_groups["group_id"].value_counts())
+    return df_groups[group_sizes > 1].reset_index(drop=True)
+
+
+def main(args):
+    df = pd.read_csv(args.input)
+
+    df_groups = get_duplicate_groups(df, args.threshold)
+    logging.info(
+        f"{len(df_groups)} of {len(df)} articles are in "
+        f"{df_groups['group_id'].nunique()} near-duplicate groups"
+    )
+
+    df_groups.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate articles")
+    parser.add_argument(
+        "-i", "--input", help="Path to cleaned articles csv file", required=True
+    )
+    parser.add_argument(
+        "-o", "--output", help="Path to output duplicates csv file", required=True
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.8,
+        help="Minimum estimated Jaccard similarity of word 5-grams",
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -1,35 +1,112 @@
 import argparse
+import numpy as np
 import pandas as pd
-from itertools import combinations
 from tqdm import tqdm
+from collections import Counter
+import underthesea
 from underthesea import ner
 import logging
 import os
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import (
+    batch_ner,
+    NerCache,
+    NerStore,
+    EntityIndex,
+    CoOccurrences,
+    aggregate_links,
+    get_link_articles,
+)
 
+# underthesea sets up the root logger on import, force ours
 logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    force=True,
 )
 
+# Number of articles whose sentences are batched through the model together
+ARTICLES_PER_BLOCK = 256
+
+# Cached NER results are only reused with the same model
+NER_MODEL_VERSION = f"underthesea-{underthesea.__version__}-deep"
+
+# Sentence level NER cache, opened in main or in each worker process
+ner_cache = None
+
+
+def open_ner_cache(path, max_entries):
+    global ner_cache
+    if path:
+        ner_cache = NerCache(path, NER_MODEL_VERSION, max_entries)
+
+
+def pop_cache_stats():
+    """
+    Flush the NER cache and return its (hits, misses) since the last call.
+    """
+    if ner_cache is None:
+        return 0, 0
+    ner_cache.flush()
+    return ner_cache.pop_stats()
+
 
 def get_ner_data(content):
     """
-    Extract Named Entity Recognition (NER) data from the content.
+    Extract Named Entity Recognition (NER) data from the content, the entities
+    of every sentence in order.
     """
     entities = []
     excluded_words = set()
 
     for sentence in content.split(". "):
-        try:
-            res = ner(sentence, deep=True)
-        except Exception as e:
-            logging.error(f"Error in NER processing: {e}")
-            continue
+        res = ner_cache.get(sentence) if ner_cache else None
+        if res is None:
+            try:
+                res = ner(sentence, deep=True)
+            except Exception as e:
+                logging.error(f"Error in NER processing: {e}")
+                continue
+            if ner_cache:
+                ner_cache.put(sentence, res)
 
         processed_entities = process_entities(res, excluded_words)
-        entities.extend(processed_entities)
+        entities.append(processed_entities)
 
-    return list(set(entities))
+    return entities
+
+
+def get_ner_data_batch(contents, batch_size=32):
+    """
+    Extract NER data from many contents at once. Sentences of all contents go
+    through the model together, then are processed per content in order.
+    Returns the entities of every sentence of every content.
+    """
+    sentences, owners = [], []
+    for i, content in enumerate(contents):
+        for sentence in content.split(". "):
+            sentences.append(sentence)
+            owners.append(i)
+
+    # Only sentences missing from the cache go through the model
+    results = [ner_cache.get(s) if ner_cache else None for s in sentences]
+    missing = [j for j, res in enumerate(results) if res is None]
+    tagged = batch_ner([sentences[j] for j in missing], batch_size)
+    for j, res in zip(missing, tagged):
+        results[j] = res
+        if ner_cache and res is not None:
+            ner_cache.put(sentences[j], res)
+
+    entities = [[] for _ in contents]
+    excluded_words = [set() for _ in contents]
+    for i, res in zip(owners, results):
+        if res is None:
+            continue
+        entities[i].append(process_entities(res, excluded_words[i]))
+
+    return entities
 
 
 def process_entities(res, excluded_words):
@@ -73,22 +150,143 @@ def is_valid_entity(entity, excluded_words):
     )
 
 
-def extract_entities_and_links(row):
+def extract_entities(row):
     """
-    Extract entities and links from a single row of the DataFrame.
+    Extract the entities of a single row of the DataFrame.
     """
     if not isinstance(row["content"], str):
         logging.warning(f'Invalid content at row {row["id"]}, {row["url"]}')
-        return [], []
+        return []
+
+    return get_ner_data(row["content"])
+
+
+def extract_block(block, batch_size):
+    """
+    Extract the entities of a block of rows, with batched NER if batch_size is
+    positive. Returns the entities of every row and the NER cache statistics.
+    """
+    if batch_size <= 0:
+        results = [extract_entities(row) for _, row in block.iterrows()]
+        return results, pop_cache_stats()
+
+    valid = block["content"].map(lambda content: isinstance(content, str))
+    for _, row in block[~valid].iterrows():
+        logging.warning(f'Invalid content at row {row["id"]}, {row["url"]}')
+
+    entities_list = iter(
+        get_ner_data_batch(block.loc[valid, "content"].tolist(), batch_size)
+    )
+    results = [next(entities_list) if is_valid else [] for is_valid in valid]
+    return results, pop_cache_stats()
+
+
+def init_worker(num_threads, cache_path=None, cache_size=None):
+    """
+    Load the NER model once when a worker process starts.
+    """
+    import torch
+    from underthesea.pipeline.ner.model_transformers import nlp  # noqa: F401
+
+    torch.set_num_threads(num_threads)
+    open_ner_cache(cache_path, cache_size)
+
+
+def extract_all_entities(df, batch_size, workers=1, cache_path=None, cache_size=None):
+    """
+    Extract the entities of all rows of the DataFrame, in blocks of
+    ARTICLES_PER_BLOCK rows spread over workers processes. Results keep the
+    order of the rows whatever the number of workers.
+    """
+    df = df[["id", "url", "content"]]
+    blocks = [
+        df.iloc[start : start + ARTICLES_PER_BLOCK]
+        for start in range(0, len(df), ARTICLES_PER_BLOCK)
+    ]
 
-    entities = get_ner_data(row["content"])
-    entities = [(str(uuid.uuid4()), e[0], e[1]) for e in entities]
-    links = [
-        (str(uuid.uuid4()), fr[1], to[1], row["id"])
-        for fr, to in combinations(entities, 2)
+    results = []
+    hits, misses = 0, 0
+    with tqdm(total=len(df)) as progress:
+        if workers > 1:
+            # Share the cores between workers instead of every worker using all
+            num_threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(
+                workers,
+                initializer=init_worker,
+                initargs=(num_threads, cache_path, cache_size),
+            ) as executor:
+                block_results = executor.map(
+                    extract_block, blocks, [batch_size] * len(blocks)
+                )
+                for block, (block_result, stats) in zip(blocks, block_results):
+                    results.extend(block_result)
+                    hits, misses = hits + stats[0], misses + stats[1]
+                    progress.update(len(block))
+        else:
+            open_ner_cache(cache_path, cache_size)
+            for block in blocks:
+                block_result, stats = extract_block(block, batch_size)
+                results.extend(block_result)
+                hits, misses = hits + stats[0], misses + stats[1]
+                progress.update(len(block))
+
+    if cache_path:
+        logging.info(f"NER cache: {hits} hits, {misses} misses")
+
+    return results
+
+
+def get_linked_groups(sentences, window=0, max_entities=0):
+    """
+    Groups of entities of an article in which every pair is linked: the
+    entities of every window of consecutive sentences, or of the whole article
+    if window is 0. With max_entities, only the most mentioned entities of the
+    article are kept.
+    """
+    if max_entities:
+        counts = Counter(entity for sentence in sentences for entity in sentence)
+        kept = set(sorted(counts, key=lambda e: (-counts[e], e))[:max_entities])
+        sentences = [[e for e in sentence if e in kept] for sentence in sentences]
+
+    # Sorted, so that results do not depend on the hash seed of the process
+    if not window or window >= len(sentences):
+        return [sorted(set(e for sentence in sentences for e in sentence))]
+    return [
+        sorted(set(e for sentence in sentences[i : i + window] for e in sentence))
+        for i in range(len(sentences) - window + 1)
     ]
 
-    return entities, links
+
+def get_co_occurrences(
+    article_ids,
+    results,
+    members=None,
+    memory_budget=None,
+    spill_dir=None,
+    window=0,
+    max_entities=0,
+):
+    """
+    Intern the entities of every article and link the pairs of them that
+    co-occur within window sentences, all of them if window is 0. Members of a
+    near-duplicate group get the links of their group representative. Pairs
+    over memory_budget bytes are spilled to spill_dir.
+    """
+    index = EntityIndex()
+    co_occurrences = CoOccurrences(memory_budget, spill_dir)
+    members = members or {}
+
+    for article_id, sentences in zip(article_ids, results):
+        groups = [
+            [index.intern(name, type_) for name, type_ in group]
+            for group in get_linked_groups(sentences, window, max_entities)
+        ]
+        co_occurrences.add_article(article_id, groups)
+        for member in members.get(article_id, []):
+            if member != article_id:
+                co_occurrences.add_article(member, groups)
+
+    return index, co_occurrences
 
 
 def main(arg):
@@ -97,20 +295,62 @@ def main(arg):
     """
     df = pd.read_csv(arg.input)
 
-    tqdm.pandas()
-    results = df.progress_apply(extract_entities_and_links, axis=1)
-    entity_list = [entity for result in results for entity in result[0]]
-    link_list = [link for result in results for link in result[1]]
+    # Incremental mode only tags articles that are not in the store yet
+    store = None
+    if arg.store:
+        store = NerStore(arg.store)
+        df = df[~df["id"].isin(store.processed_articles())]
+        logging.info(f"{len(df)} new articles to process")
+    article_ids = df["id"].tolist()
+
+    # Near-duplicate articles share the NER results of their group representative
+    members = {}
+    if arg.duplicates:
+        df_groups = pd.read_csv(arg.duplicates)
+        # Only groups whose representative is tagged in this run share its
+        # results, new members of a group tagged before are tagged themselves
+        df_groups = df_groups[
+            df_groups["group_id"].isin(df["id"]) & df_groups["id"].isin(df["id"])
+        ]
+        members = df_groups.groupby("group_id")["id"].apply(list).to_dict()
+        duplicates = df_groups.loc[df_groups["id"] != df_groups["group_id"], "id"]
+        df = df[~df["id"].isin(duplicates)]
+        logging.info(f"Skipping NER of {len(duplicates)} near-duplicate articles")
+
+    results = extract_all_entities(
+        df, arg.batch_size, arg.workers, arg.ner_cache, arg.ner_cache_size
+    )
+    memory_budget = arg.memory_budget * 2**20 if arg.memory_budget else None
+    window = {"sentence": 1, "window": arg.window, "article": 0}[arg.scope]
+    index, co_occurrences = get_co_occurrences(
+        df["id"],
+        results,
+        members,
+        memory_budget,
+        arg.spill_dir,
+        window,
+        arg.max_entities,
+    )
 
-    print("Number of entities:", len(entity_list))
-    print("Number of links:", len(link_list))
+    print("Number of unique entities:", len(index))
+    print("Number of links:", len(co_occurrences))
 
-    df_entity = pd.DataFrame(entity_list, columns=["id", "entity", "type"])
-    df_entity.drop_duplicates(subset=["entity"], inplace=True)
-    df_entity["type"] = df_entity["type"].str[-3:]
+    # Links are aggregated one partition of pairs at a time
+    df_entity = index.to_frame()
+    link_chunks = (
+        export_links(process_links(*arrays), index, co_occurrences.articles)
+        for arrays in co_occurrences.partitions()
+    )
 
-    df_link = pd.DataFrame(link_list, columns=["id", "from", "to", "article_ids"])
-    df_link = process_links(df_link)
+    # Merge into the store and output everything it holds
+    if store:
+        store.upsert_entities(df_entity)
+        for df_link in link_chunks:
+            store.upsert_links(df_link)
+        store.add_articles(article_ids)
+        df_entity, df_link = store.export()
+        store.close()
+        link_chunks = [df_link]
 
     # Ensure output directory exists
     os.makedirs(arg.output, exist_ok=True)
@@ -119,35 +359,55 @@ def main(arg):
     # If yes, append the filter to the output file name
     if "_" in os.path.basename(arg.input):
         filter = os.path.basename(arg.input).split("_")[-1].split(".")[0]
-        df_entity.to_csv(os.path.join(arg.output, f"entity_{filter}.csv"), index=False)
-        df_link.to_csv(os.path.join(arg.output, f"link_{filter}.csv"), index=False)
+        entity_path = os.path.join(arg.output, f"entity_{filter}.csv")
+        link_path = os.path.join(arg.output, f"link_{filter}.csv")
     else:
-        df_entity.to_csv(os.path.join(arg.output, "entity.csv"), index=False)
-        df_link.to_csv(os.path.join(arg.output, "link.csv"), index=False)
+        entity_path = os.path.join(arg.output, "entity.csv")
+        link_path = os.path.join(arg.output, "link.csv")
+
+    df_entity.to_csv(entity_path, index=False)
+    for i, df_link in enumerate(link_chunks):
+        df_link.to_csv(link_path, index=False, mode="a" if i else "w", header=not i)
 
 
-def process_links(df_link):
+def process_links(fr, to, article):
     """
-    Process the link DataFrame to remove duplicates and calculate weights.
+    Process the co-occurrences to remove duplicates and calculate weights.
+    A-B and B-A are the same link, entities and articles stay integer indices.
     """
-    df_link["from_to"] = df_link.apply(
-        lambda x: " ".join(sorted([x["from"], x["to"]])), axis=1
+    fr, to, weight, offsets, articles = aggregate_links(fr, to, article)
+    return pd.DataFrame(
+        {
+            "from": fr,
+            "to": to,
+            "article_ids": get_link_articles(offsets, articles),
+            "weight": weight,
+        }
     )
-    df_link.drop_duplicates(subset=["from_to", "article_ids"], inplace=True)
-    df_link.drop("from_to", axis=1, inplace=True)
 
-    df_link = (
-        df_link.groupby(["from", "to"])
-        .agg(
-            {
-                "id": lambda x: x.iloc[0],
-                "article_ids": lambda x: list(x),
-            }
-        )
-        .reset_index()
+
+def export_links(df_link, index, articles):
+    """
+    Replace entity and article indices of the processed links by entity names
+    and article ids, and give every link its uuid. Names are ordered so that
+    from < to, entity indices change from run to run but names do not.
+    """
+    names = pd.Series(index.names, dtype=object)
+    articles = pd.Series(articles, dtype=object)
+    fr = names.take(df_link["from"]).values
+    to = names.take(df_link["to"]).values
+    swap = fr > to
+    return pd.DataFrame(
+        {
+            "from": np.where(swap, to, fr),
+            "to": np.where(swap, fr, to),
+            "id": [str(uuid.uuid4()) for _ in range(len(df_link))],
+            "article_ids": [
+                articles.take(ids).tolist() for ids in df_link["article_ids"]
+            ],
+            "weight": df_link["weight"].values,
+        }
     )
-    df_link["weight"] = df_link["article_ids"].apply(len)
-    return df_link
 
 
 if __name__ == "__main__":
@@ -158,6 +418,66 @@ if __name__ == "__main__":
     parser.add_argument(
         "-o", "--output", help="Path to output csv file", default="data/"
     )
+    parser.add_argument(
+        "--duplicates",
+        help="Path to near-duplicate groups from find_duplicates.py, NER runs "
+        "once per group",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of NER processes, each loads the model once",
+    )
+    parser.add_argument(
+        "--scope",
+        choices=["sentence", "window", "article"],
+        default="article",
+        help="Link entities co-occurring in the same sentence, within --window "
+        "consecutive sentences or anywhere in the article",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=3,
+        help="Number of consecutive sentences of the window scope",
+    )
+    parser.add_argument(
+        "--max-entities",
+        type=int,
+        default=0,
+        help="Only link the most mentioned entities of each article, 0 links all",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=0,
+        help="Memory in MB for link aggregation, pairs over it are spilled to "
+        "disk and aggregated one partition at a time, 0 keeps all in memory",
+    )
+    parser.add_argument(
+        "--spill-dir", help="Directory for spilled pairs, the system temp by default"
+    )
+    parser.add_argument(
+        "--store",
+        help="Path to a SQLite entity and link store, only articles not processed "
+        "before are tagged and the output holds the merged store",
+    )
+    parser.add_argument(
+        "--ner-cache", help="Path to a SQLite cache of NER results per sentence"
+    )
+    parser.add_argument(
+        "--ner-cache-size",
+        type=int,
+        default=1_000_000,
+        help="Maximum number of sentences in the NER cache",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Number of sentences per NER forward pass, 0 tags one sentence at a time",
+    )
 
     args = parser.parse_args()
     main(args)
@@ -1,2 +1,20 @@
 from .vnanet import *
-from .thanhnien import *
\ No newline at end of file
+from .thanhnien import *
+from .throttle import *
+from .feed_cache import *
+from .seen_index import *
+from .archive import *
+from .extractors import *
+from .writer import *
+from .cleaning import *
+from .minhash import *
+from .ner_batch import *
+from .ner_cache import *
+from .ner_store import *
+from .entity_index import *
+from .link_aggregation import *
+from .scoring import *
+from .communities import *
+from .graph import *
+from .windows import *
+from .layout import *
\ No newline at end of file
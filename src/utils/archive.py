@@ -0,0 +1,73 @@
+# Compressed, content-addressed archive of downloaded article pages
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+
+class HtmlArchive:
+    '''Store raw article HTML so extraction can be re-run without network.
+
+    Layout under root:
+        blobs/<sha[:2]>/<sha>.html.gz   gzipped page, keyed by SHA-256 of the HTML
+        manifests/<fetch date>.jsonl    one record per fetch: url, sha, fetched and
+                                        the article metadata (id, title, ...)
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'manifests'), exist_ok=True)
+
+    def _blob_path(self, sha):
+        return os.path.join(self.root, 'blobs', sha[:2], sha + '.html.gz')
+
+    def put(self, url, html, record=None):
+        '''Store html fetched from url today, return its SHA-256'''
+        data = html.encode('utf-8')
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        fetched = datetime.date.today().isoformat()
+        entry = dict(record or {}, url=url, sha=sha, fetched=fetched)
+        manifest = os.path.join(self.root, 'manifests', fetched + '.jsonl')
+        with self._lock:
+            with open(manifest, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return sha
+
+    def get(self, sha):
+        '''Return the archived HTML with the given SHA-256'''
+        with gzip.open(self._blob_path(sha), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def records(self, fetched_from=None, fetched_to=None):
+        '''Yield manifest records, optionally limited to a fetch date range'''
+        manifest_dir = os.path.join(self.root, 'manifests')
+        for file in sorted(os.listdir(manifest_dir)):
+            fetched = os.path.splitext(file)[0]
+            if fetched_from and fetched < fetched_from:
+                continue
+            if fetched_to and fetched > fetched_to:
+                continue
+            with open(os.path.join(manifest_dir, file), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+if __name__ == '__main__':
+    archive = HtmlArchive('/tmp/html-archive')
+    sha = archive.put('https://vtv.vn/abc.htm', '<html>Xin chào</html>', {'title': 'abc'})
+    print(archive.get(sha))
+    print(list(archive.records()))
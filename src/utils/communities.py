@@ -0,0 +1,100 @@
+# Community detection on the sparse adjacency matrix of the entity graph
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+
+
+def louvain(adjacency, resolution=1.0, seed=None):
+    '''Louvain communities of the weighted graph, the community of every node'''
+    G = nx.from_scipy_sparse_array(adjacency)
+    communities = nx.community.louvain_communities(
+        G, weight='weight', resolution=resolution, seed=seed
+    )
+    labels = np.empty(adjacency.shape[0], dtype=np.int64)
+    for label, community in enumerate(communities):
+        labels[list(community)] = label
+    return labels
+
+
+def label_propagation(adjacency, max_iter=100, seed=None):
+    '''Weighted label propagation, the community of every node.
+
+    Every iteration, a random half of the nodes take the label with the most
+    weight among their neighbours, all at once. Updating only half of them
+    keeps two neighbours from swapping labels forever.
+    '''
+    n = adjacency.shape[0]
+    if adjacency.nnz == 0:
+        # No links, every node is its own community
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    coo = sparse.coo_matrix(adjacency)
+    rows, cols, weights = coo.row.astype(np.int64), coo.col, coo.data
+    labels = np.arange(n)
+
+    for _ in range(max_iter):
+        # Total weight of every (node, neighbour label)
+        keys, inverse = np.unique(rows * n + labels[cols], return_inverse=True)
+        totals = np.bincount(inverse, weights=weights)
+        nodes, candidates = keys // n, keys % n
+
+        # Heaviest label of every node, the smallest label on ties
+        order = np.lexsort((candidates, -totals, nodes))
+        first = np.r_[True, nodes[order][1:] != nodes[order][:-1]]
+        best = labels.copy()
+        best[nodes[order][first]] = candidates[order][first]
+
+        if (best == labels).all():
+            break
+        labels = np.where(rng.random(n) < 0.5, best, labels)
+
+    return labels
+
+
+COMMUNITY_METHODS = {
+    'louvain': louvain,
+    'label_propagation': label_propagation,
+}
+
+
+def detect_communities(adjacency, method='louvain', min_size=1, seed=None):
+    '''Community of every node, numbered from the largest community. Nodes of
+    communities smaller than min_size get -1.'''
+    labels = COMMUNITY_METHODS[method](adjacency, seed=seed)
+    _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+
+    # Renumber by decreasing size
+    order = np.argsort(-sizes, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    labels = rank[labels]
+    labels[sizes[order][labels] < min_size] = -1
+    return labels
+
+
+def get_membership_index(labels):
+    '''Nodes of every community: community c has the nodes
+    members[offsets[c]:offsets[c + 1]]'''
+    clustered = np.flatnonzero(labels >= 0)
+    members = clustered[np.argsort(labels[clustered], kind='stable')]
+    counts = np.bincount(labels[clustered], minlength=labels.max(initial=-1) + 1)
+    offsets = np.r_[0, np.cumsum(counts)]
+    return members, offsets
+
+
+def get_community_adjacency(adjacency, members, offsets, community):
+    '''Adjacency matrix of the subgraph of a community and its nodes'''
+    nodes = members[offsets[community]:offsets[community + 1]]
+    return adjacency[nodes][:, nodes], nodes
+
+
+if __name__ == '__main__':
+    # Graphs without links, e.g. when no link passes the weight threshold
+    for n in (0, 3):
+        empty = sparse.csr_matrix((n, n))
+        for method in COMMUNITY_METHODS:
+            labels = detect_communities(empty, method, seed=0)
+            print(method, n, labels)
+            assert len(labels) == n
@@ -0,0 +1,195 @@
+# Interned entity ids and typed arrays of entity co-occurrences
+
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .link_aggregation import canonical_pairs
+
+# One spilled co-occurrence
+RECORD = np.dtype([('from', '<i4'), ('to', '<i4'), ('article', '<i4')])
+
+# Peak memory per pair while aggregating: sort keys, sort order and copies
+BYTES_PER_PAIR = 48
+
+# Partitions too big for the memory budget are split again up to this depth
+MAX_PARTITION_DEPTH = 3
+
+
+class EntityIndex:
+    '''Interning table of entity names to dense integer ids.
+
+    An entity keeps the type it was first interned with, like
+    drop_duplicates(subset=['entity']) on the full list of mentions did.
+    '''
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.types = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name, type_):
+        entity_id = self.ids.get(name)
+        if entity_id is None:
+            entity_id = len(self.names)
+            self.ids[name] = entity_id
+            self.names.append(name)
+            self.types.append(type_)
+        return entity_id
+
+    def to_frame(self):
+        '''Entities with their uuid, which is only assigned here'''
+        return pd.DataFrame({
+            'id': [str(uuid.uuid4()) for _ in self.names],
+            'entity': self.names,
+            'type': [type_[-3:] for type_ in self.types],
+        })
+
+
+class CoOccurrences:
+    '''Pairs of entity ids occurring in the same article.
+
+    Pairs are kept as int32 arrays of from and to entity ids plus the index of
+    their article in articles, one chunk per article until arrays() joins them.
+
+    With a memory_budget in bytes, pairs are spilled to disk once they would
+    need more than that to aggregate. Spilled pairs are hash partitioned by
+    their canonical pair, so that every partition can be aggregated on its own,
+    and partitions() reads them back one at a time.
+    '''
+
+    def __init__(self, memory_budget=None, spill_dir=None, num_partitions=64):
+        self.articles = []
+        self.max_pairs = memory_budget // BYTES_PER_PAIR if memory_budget else None
+        self.spill_dir = spill_dir
+        self.num_partitions = num_partitions
+        self._count = 0
+        self._pending = 0
+        self._dir = None
+        self._from = []
+        self._to = []
+        self._article = []
+
+    def __len__(self):
+        return self._count
+
+    def add_article(self, article_id, groups):
+        '''Link every pair of entity ids within each of groups, in the order
+        of combinations(). A pair in several groups is only kept once.'''
+        article = len(self.articles)
+        self.articles.append(article_id)
+
+        fr, to = [], []
+        for entity_ids in groups:
+            entity_ids = np.asarray(entity_ids, dtype=np.int32)
+            first, second = np.triu_indices(len(entity_ids), 1)
+            fr.append(entity_ids[first])
+            to.append(entity_ids[second])
+        if len(groups) > 1:
+            lo, hi = canonical_pairs(np.concatenate(fr), np.concatenate(to))
+            pairs = np.unique((lo.astype(np.int64) << 32) | hi)
+            fr = (pairs >> 32).astype(np.int32)
+            to = (pairs & 0xFFFFFFFF).astype(np.int32)
+        elif groups:
+            fr, to = fr[0], to[0]
+        if len(fr) == 0:
+            return
+        self._from.append(fr)
+        self._to.append(to)
+        self._article.append(np.full(len(fr), article, dtype=np.int32))
+
+        self._count += len(fr)
+        self._pending += len(fr)
+        if self.max_pairs and self._pending > self.max_pairs:
+            self._spill()
+
+    def arrays(self):
+        '''Return the (from, to, article) arrays of all pairs in memory'''
+        if not self._from:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, empty, empty
+        self._from = [np.concatenate(self._from)]
+        self._to = [np.concatenate(self._to)]
+        self._article = [np.concatenate(self._article)]
+        return self._from[0], self._to[0], self._article[0]
+
+    def partitions(self):
+        '''Yield (from, to, article) arrays of pairs, both orders of a pair
+        are always in the same arrays. Without spilling, all pairs at once.'''
+        if self._dir is None:
+            yield self.arrays()
+            return
+
+        self._spill()
+        try:
+            for partition in range(self.num_partitions):
+                yield from self._read(os.path.join(self._dir, str(partition)), 1)
+        finally:
+            shutil.rmtree(self._dir)
+            self._dir = None
+
+    def _spill(self):
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix='links-', dir=self.spill_dir)
+            logging.info(f'Spilling co-occurrences to {self._dir}')
+        if self._from:
+            self._write(os.path.join(self._dir, ''), *self.arrays(), 0)
+        self._from, self._to, self._article = [], [], []
+        self._pending = 0
+
+    def _write(self, prefix, fr, to, article, depth):
+        '''Append pairs to the files of their partitions at depth'''
+        partitions = get_partitions(fr, to, self.num_partitions, depth)
+        order = np.argsort(partitions, kind='stable')
+        counts = np.bincount(partitions, minlength=self.num_partitions)
+
+        records = np.empty(len(order), dtype=RECORD)
+        records['from'], records['to'] = fr[order], to[order]
+        records['article'] = article[order]
+        start = 0
+        for partition, count in enumerate(counts):
+            if count:
+                with open(f'{prefix}{partition}', 'ab') as f:
+                    records[start:start + count].tofile(f)
+            start += count
+
+    def _read(self, path, depth):
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path) // RECORD.itemsize
+
+        # Too big to aggregate at once, partition it further. A single very
+        # frequent pair cannot be split, give up after a few levels.
+        if size > self.max_pairs and depth < MAX_PARTITION_DEPTH:
+            records = np.memmap(path, dtype=RECORD, mode='r')
+            for start in range(0, size, self.max_pairs):
+                chunk = np.array(records[start:start + self.max_pairs])
+                self._write(path + '.', chunk['from'], chunk['to'],
+                            chunk['article'], depth)
+            del records
+            os.remove(path)
+            for partition in range(self.num_partitions):
+                yield from self._read(f'{path}.{partition}', depth + 1)
+            return
+
+        records = np.fromfile(path, dtype=RECORD)
+        os.remove(path)
+        yield records['from'], records['to'], records['article']
+
+
+def get_partitions(fr, to, num_partitions, depth=0):
+    '''Partition of every pair, the same for A-B and B-A'''
+    lo = np.minimum(fr, to).astype(np.uint64)
+    hi = np.maximum(fr, to).astype(np.uint64)
+    key = lo * np.uint64(0x9E3779B97F4A7C15) + hi * np.uint64(0xC2B2AE3D27D4EB4F)
+    key ^= key >> np.uint64(31)
+    key //= np.uint64(num_partitions ** depth)
+    return (key % np.uint64(num_partitions)).astype(np.intp)
@@ -0,0 +1,74 @@
+# Persistent ETag/Last-Modified cache used for conditional RSS polling
+
+import json
+import os
+import threading
+
+
+class FeedCache:
+    '''Per-feed ETag, Last-Modified and GUIDs seen on the previous poll.
+
+    Stored as a single JSON file:
+    {rss_link: {"etag": ..., "modified": ..., "guids": [...]}}
+
+    update() only stages the new entry, commit() makes it part of what save()
+    writes, so a feed is not marked as polled before its articles are written.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._feeds = {}
+        self._pending = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self._feeds = json.load(f)
+
+    def get(self, rss_link):
+        '''Return the cached entry of rss_link, or an empty entry'''
+        with self._lock:
+            entry = self._feeds.get(rss_link, {})
+        return {
+            'etag': entry.get('etag'),
+            'modified': entry.get('modified'),
+            'guids': set(entry.get('guids', [])),
+        }
+
+    def update(self, rss_link, etag, modified, guids):
+        '''Stage the validators and item GUIDs of the latest poll'''
+        with self._lock:
+            self._pending[rss_link] = {
+                'etag': etag,
+                'modified': modified,
+                'guids': sorted(guids),
+            }
+
+    def commit(self, rss_link):
+        '''Keep the staged entry of rss_link'''
+        with self._lock:
+            if rss_link in self._pending:
+                self._feeds[rss_link] = self._pending.pop(rss_link)
+
+    def save(self):
+        '''Write the cache to disk, replacing the previous file atomically'''
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._feeds, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def get_item_guid(item):
+    '''GUID of an RSS item, falling back to its link'''
+    return item.get('id') or item['link']
+
+
+if __name__ == '__main__':
+    cache = FeedCache('/tmp/feed-cache.json')
+    cache.update('https://vnexpress.net/rss/thoi-su.rss', '"abc"', None, {'a', 'b'})
+    cache.commit('https://vnexpress.net/rss/thoi-su.rss')
+    cache.save()
+    print(FeedCache('/tmp/feed-cache.json').get('https://vnexpress.net/rss/thoi-su.rss'))
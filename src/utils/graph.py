@@ -0,0 +1,89 @@
+# Entity graph built once from the link columns, cached on disk
+
+import logging
+import os
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .scoring import get_adjacency
+
+
+class EntityGraph:
+    '''Undirected weighted entity graph as a CSR adjacency matrix.
+
+    Row i of adjacency is the node nodes[i], index maps nodes back to rows.
+    '''
+
+    def __init__(self, adjacency, nodes):
+        self.adjacency = adjacency
+        self.nodes = nodes
+        self.index = pd.Index(nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_links(cls, df_link):
+        return cls(*get_adjacency(df_link['from'], df_link['to'], df_link['weight']))
+
+    def to_networkx(self):
+        '''networkx Graph with the same nodes and weights, built in bulk'''
+        G = nx.from_scipy_sparse_array(self.adjacency)
+        return nx.relabel_nodes(G, dict(enumerate(self.nodes)), copy=False)
+
+    def save(self, path, stamp=()):
+        nodes = np.asarray(self.nodes)
+        if nodes.dtype == object:
+            nodes = nodes.astype(str)
+        np.savez(
+            path,
+            indptr=self.adjacency.indptr,
+            indices=self.adjacency.indices,
+            data=self.adjacency.data,
+            nodes=nodes,
+            stamp=np.asarray(stamp, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path, stamp=()):
+        '''Graph saved at path, None if it was saved with another stamp'''
+        with np.load(path, allow_pickle=False) as f:
+            if f['stamp'].tolist() != list(stamp):
+                return None
+            nodes = f['nodes']
+            adjacency = sparse.csr_matrix(
+                (f['data'], f['indices'], f['indptr']),
+                shape=(len(nodes), len(nodes)),
+            )
+        if nodes.dtype.kind == 'U':
+            nodes = nodes.astype(object)
+        return cls(adjacency, nodes)
+
+
+def get_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_graph(link_path, cache=True):
+    '''Entity graph of a link csv file.
+
+    With cache, the graph is saved next to the file and later loads reuse it
+    as long as the link file has the same size and modification time.
+    '''
+    cache_path = link_path + '.graph.npz'
+    stamp = get_stamp(link_path)
+    if cache and os.path.exists(cache_path):
+        graph = EntityGraph.load(cache_path, stamp)
+        if graph is not None:
+            logging.info(f'Loaded graph from {cache_path}')
+            return graph
+
+    df_link = pd.read_csv(link_path, usecols=['from', 'to', 'weight'])
+    graph = EntityGraph.from_links(df_link)
+    if cache:
+        graph.save(cache_path, stamp)
+    return graph
@@ -0,0 +1,209 @@
+# Server-side ForceAtlas2 layout of the entity graph
+
+import numpy as np
+from scipy import sparse
+
+
+def get_initial_positions(adjacency, nodes, previous=None, seed=None):
+    '''Start positions of nodes, and which of them have a previous position.
+
+    Nodes in previous (a dict of node to (x, y)) keep their position, new nodes
+    start at the mean of their placed neighbours, or at random if they have
+    none, with a little jitter so that they do not overlap.
+    '''
+    n = len(nodes)
+    rng = np.random.default_rng(seed)
+    previous = previous or {}
+    pos = np.full((n, 2), np.nan)
+    placed = np.zeros(n, dtype=bool)
+    for i, node in enumerate(nodes):
+        if node in previous:
+            pos[i] = previous[node]
+            placed[i] = True
+
+    scale = np.nanstd(pos[placed]) if placed.sum() > 1 else np.sqrt(max(n, 1))
+    if placed.any():
+        # Mean position of the placed neighbours of every node
+        structure = (adjacency != 0).astype(np.float64)
+        known = np.where(placed[:, None], pos, 0.0)
+        counts = structure @ placed.astype(np.float64)
+        sums = structure @ known
+        inherit = ~placed & (counts > 0)
+        pos[inherit] = sums[inherit] / counts[inherit, None]
+        pos[inherit] += rng.normal(scale=0.05 * scale, size=(inherit.sum(), 2))
+
+    missing = np.isnan(pos[:, 0])
+    pos[missing] = rng.uniform(-scale, scale, size=(missing.sum(), 2))
+    return pos, placed
+
+
+def _grid_cells(pos, grid_size):
+    lo = pos.min(axis=0)
+    span = np.maximum(pos.max(axis=0) - lo, 1e-9)
+    cells = np.minimum((pos - lo) / span * grid_size, grid_size - 1).astype(np.int64)
+    return cells[:, 0], cells[:, 1]
+
+
+def _sum_by_node(index, values, n):
+    '''Sum the rows of values of every node, faster than np.add.at'''
+    return np.stack([
+        np.bincount(index, weights=values[:, 0], minlength=n),
+        np.bincount(index, weights=values[:, 1], minlength=n),
+    ], axis=1)
+
+
+def _repulsion(pos, mass, kr, barnes_hut, chunk_size=1024):
+    '''Repulsion kr * m_i * m_j / d between every pair of nodes.
+
+    With barnes_hut, space is cut into a quadtree with about 4 nodes per leaf
+    cell. Nodes in the 3x3 neighbouring leaf cells repel exactly, farther
+    nodes are grouped into the largest cells that are still well separated
+    from the node and act as a single node of their total mass at their centre
+    of mass, for O(n log n) work.
+    '''
+    n = len(pos)
+    force = np.zeros_like(pos)
+
+    if not barnes_hut:
+        for start in range(0, n, chunk_size):
+            delta = pos[start:start + chunk_size, None, :] - pos[None, :, :]
+            dist2 = np.maximum((delta ** 2).sum(axis=2), 1e-9)
+            strength = kr * mass[start:start + chunk_size, None] * mass[None, :] / dist2
+            force[start:start + chunk_size] = (delta * strength[:, :, None]).sum(axis=1)
+        return force
+
+    # Quadtree levels, the finest one has about 4 nodes per cell
+    depth = max(1, int(np.ceil(np.log2(np.sqrt(n / 4)))))
+    grid_size = 2 ** depth
+    cx, cy = _grid_cells(pos, grid_size)
+    cell = cx * grid_size + cy
+    num_cells = grid_size * grid_size
+
+    # Far field, level by level. At each level, a node interacts with the
+    # cells that are children of the neighbours of its parent cell but are not
+    # its own neighbours, as a single node at their centre of mass. Together
+    # with the near field this covers every other node exactly once.
+    for level in range(2, depth + 1):
+        size = 2 ** level
+        shift = depth - level
+        lx, ly = cx >> shift, cy >> shift
+        index = lx * size + ly
+        level_mass = np.bincount(index, weights=mass, minlength=size * size)
+        centre = np.stack([
+            np.bincount(index, weights=mass * pos[:, 0], minlength=size * size),
+            np.bincount(index, weights=mass * pos[:, 1], minlength=size * size),
+        ], axis=1) / np.maximum(level_mass, 1e-12)[:, None]
+
+        for ox in range(-2, 4):
+            for oy in range(-2, 4):
+                # Children of the parent's neighbours, relative to the parent
+                tx = ((lx >> 1) << 1) + ox
+                ty = ((ly >> 1) << 1) + oy
+                valid = ((tx >= 0) & (tx < size) & (ty >= 0) & (ty < size)
+                         & ((np.abs(tx - lx) > 1) | (np.abs(ty - ly) > 1)))
+                i = np.flatnonzero(valid)
+                target = tx[i] * size + ty[i]
+                delta = pos[i] - centre[target]
+                dist2 = np.maximum((delta ** 2).sum(axis=1), 1e-9)
+                strength = kr * mass[i] * level_mass[target] / dist2
+                force[i] += delta * strength[:, None]
+
+    # Near field, every node against the nodes of its 3x3 neighbouring cells
+    order = np.argsort(cell, kind='stable')
+    counts = np.bincount(cell, minlength=num_cells)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            nx_, ny_ = cx + dx, cy + dy
+            valid = (nx_ >= 0) & (nx_ < grid_size) & (ny_ >= 0) & (ny_ < grid_size)
+            i = np.flatnonzero(valid)
+            neighbour = nx_[i] * grid_size + ny_[i]
+            sizes = counts[neighbour]
+            i = np.repeat(i, sizes)
+            offsets = np.arange(len(i)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            j = order[np.repeat(starts[neighbour], sizes) + offsets]
+            keep = i != j
+            i, j = i[keep], j[keep]
+            delta = pos[i] - pos[j]
+            dist2 = np.maximum((delta ** 2).sum(axis=1), 1e-9)
+            strength = kr * mass[i] * mass[j] / dist2
+            force += _sum_by_node(i, delta * strength[:, None], n)
+    return force
+
+
+def forceatlas2(adjacency, pos, iterations=100, scaling=2.0, gravity=1.0,
+                barnes_hut=True, jitter_tolerance=1.0, anchored=None,
+                anchor_speed=0.02):
+    '''ForceAtlas2 layout of a weighted graph from the (n, 2) positions pos.
+
+    Attraction is linear in distance and weight, repulsion is scaling times
+    (degree + 1) of both nodes over their distance, gravity pulls every node
+    to the centre. Node speeds adapt to their swinging like in Gephi. Nodes in
+    anchored move at anchor_speed of their speed, so that a graph laid out
+    from the day before mostly moves its new nodes.
+    '''
+    n = len(pos)
+    pos = np.array(pos, dtype=np.float64)
+    if n < 2:
+        return pos
+
+    coo = sparse.coo_matrix(adjacency)
+    off = coo.row != coo.col
+    rows, cols, weights = coo.row[off], coo.col[off], coo.data[off]
+    mass = np.bincount(rows, minlength=n) + 1.0
+    node_speed = np.ones(n)
+    if anchored is not None:
+        node_speed[anchored] = anchor_speed
+
+    speed, speed_efficiency = 1.0, 1.0
+    previous_force = np.zeros_like(pos)
+    for _ in range(iterations):
+        force = _repulsion(pos, mass, scaling, barnes_hut)
+
+        # Attraction along every edge, the adjacency holds both directions
+        delta = pos[rows] - pos[cols]
+        force -= _sum_by_node(rows, weights[:, None] * delta, n)
+
+        # Gravity towards the centre
+        distance = np.maximum(np.linalg.norm(pos, axis=1), 1e-9)
+        force -= (scaling * gravity * mass / distance)[:, None] * pos
+
+        # Adaptive speed from the swinging and traction of the nodes
+        swinging = mass * np.linalg.norm(force - previous_force, axis=1)
+        traction = mass * np.linalg.norm(force + previous_force, axis=1) / 2
+        total_swinging, total_traction = swinging.sum(), traction.sum()
+
+        estimated_jitter = 0.05 * np.sqrt(n)
+        jitter = jitter_tolerance * max(np.sqrt(estimated_jitter), min(
+            10.0, estimated_jitter * total_traction / n ** 2))
+        min_efficiency = 0.05
+        if total_traction and total_swinging / total_traction > 2.0:
+            if speed_efficiency > min_efficiency:
+                speed_efficiency *= 0.5
+            jitter = max(jitter, jitter_tolerance)
+        target_speed = (jitter * speed_efficiency * total_traction
+                        / max(total_swinging, 1e-12))
+        if total_swinging > jitter * total_traction:
+            if speed_efficiency > min_efficiency:
+                speed_efficiency *= 0.7
+        elif speed < 1000:
+            speed_efficiency *= 1.3
+        speed = speed + min(target_speed - speed, 0.5 * speed)
+
+        factor = speed / (1.0 + np.sqrt(speed * swinging))
+        # A node never moves more than 10 units at once
+        magnitude = np.maximum(np.linalg.norm(force, axis=1), 1e-12)
+        factor = np.minimum(factor, 10.0 / magnitude) * node_speed
+        pos += force * factor[:, None]
+        previous_force = force
+
+    return pos
+
+
+def layout_graph(adjacency, nodes, previous=None, iterations=100,
+                 barnes_hut=True, seed=None):
+    '''ForceAtlas2 positions of nodes as an (n, 2) array, starting from the
+    previous positions of the nodes that have one'''
+    pos, placed = get_initial_positions(adjacency, nodes, previous, seed)
+    return forceatlas2(adjacency, pos, iterations, barnes_hut=barnes_hut,
+                       anchored=placed)
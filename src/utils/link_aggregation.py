@@ -0,0 +1,51 @@
+# Vectorized aggregation of entity co-occurrences into weighted links
+
+import numpy as np
+
+
+def canonical_pairs(fr, to):
+    '''Order every pair so that A-B and B-A are the same link'''
+    return np.minimum(fr, to), np.maximum(fr, to)
+
+
+def aggregate_links(fr, to, article):
+    '''Group co-occurrences by their canonical entity pair.
+
+    fr, to are int32 entity ids and article the index of the article of each
+    co-occurrence, a pair occurring several times in one article counts once.
+    Returns (from, to, weight, offsets, articles) where the i-th link occurs in
+    weight[i] articles, articles[offsets[i]:offsets[i + 1]] in ascending order.
+    '''
+    lo, hi = canonical_pairs(fr, to)
+    key = (lo.astype(np.int64) << 32) | hi.astype(np.int64)
+    order = np.lexsort((article, key))
+    key, article = key[order], article[order]
+
+    # Sorted by pair then article, repeats are next to each other
+    keep = np.ones(len(key), dtype=bool)
+    keep[1:] = (key[1:] != key[:-1]) | (article[1:] != article[:-1])
+    key, article = key[keep], article[keep]
+
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else key
+    offsets = np.r_[starts, len(key)].astype(np.int64)
+    links = key[starts]
+    return (
+        (links >> 32).astype(np.int32),
+        (links & 0xFFFFFFFF).astype(np.int32),
+        np.diff(offsets),
+        offsets,
+        article,
+    )
+
+
+def get_link_articles(offsets, articles):
+    '''Articles of every link from aggregate_links, a list of arrays that is
+    empty when there are no links'''
+    return [articles[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+if __name__ == '__main__':
+    fr = np.array([0, 1, 0, 2, 0], dtype=np.int32)
+    to = np.array([1, 0, 1, 0, 2], dtype=np.int32)
+    article = np.array([0, 1, 0, 1, 2], dtype=np.int32)
+    print(aggregate_links(fr, to, article))
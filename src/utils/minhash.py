@@ -0,0 +1,92 @@
+# MinHash signatures and LSH banding to find near-duplicate articles
+
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# Largest prime below 2**32, keeps a * hash + b inside uint64
+MERSENNE_PRIME = np.uint64(4294967291)
+
+
+def get_shingles(text, shingle_size=5):
+    '''Hashes of the word shingle_size-grams of text, none if text has fewer
+    than shingle_size words'''
+    words = text.lower().split()
+    shingles = {
+        zlib.crc32(' '.join(words[i:i + shingle_size]).encode('utf-8'))
+        for i in range(len(words) - shingle_size + 1)
+    }
+    return np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+
+
+def get_permutations(num_perm, seed=1):
+    '''Coefficients (a, b) of num_perm random hash functions a * x + b mod p'''
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signature(shingles, permutations):
+    '''MinHash signature of a set of shingle hashes'''
+    a, b = permutations
+    hashed = (np.outer(a, shingles) + b[:, None]) % MERSENNE_PRIME
+    return hashed.min(axis=1)
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def find_near_duplicates(texts, threshold=0.8, num_perm=128, bands=16, shingle_size=5):
+    '''Group near-identical texts.
+
+    Candidate pairs share at least one LSH band of their MinHash signatures and
+    are kept if the estimated Jaccard similarity is at least threshold.
+    Returns, for every text, the index of the first text of its group.
+    Texts shorter than shingle_size words, empty ones included, have no
+    shingles to compare and are never grouped.
+    '''
+    rows = num_perm // bands
+    permutations = get_permutations(num_perm)
+    signatures = np.zeros((len(texts), num_perm), dtype=np.uint64)
+    indexed = []
+    for i, text in enumerate(texts):
+        shingles = get_shingles(text, shingle_size)
+        if len(shingles):
+            signatures[i] = minhash_signature(shingles, permutations)
+            indexed.append(i)
+
+    parents = list(range(len(texts)))
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_signatures = signatures[:, band * rows:(band + 1) * rows]
+        for i in indexed:
+            buckets[bytes(band_signatures[i])].append(i)
+
+        for bucket in buckets.values():
+            first = bucket[0]
+            for i in bucket[1:]:
+                if _find(parents, i) == _find(parents, first):
+                    continue
+                similarity = np.mean(signatures[i] == signatures[first])
+                if similarity >= threshold:
+                    root_i, root_first = _find(parents, i), _find(parents, first)
+                    # The earliest text stays the representative of the group
+                    parents[max(root_i, root_first)] = min(root_i, root_first)
+
+    return [_find(parents, i) for i in range(len(texts))]
+
+
+if __name__ == '__main__':
+    base = 'Thủ tướng Phạm Minh Chính chủ trì phiên họp Chính phủ thường kỳ tháng 6 tại Hà Nội sáng nay'
+    print(find_near_duplicates([base, base + ' (TTXVN)', 'Giá vàng hôm nay tăng mạnh', base]))
+
+    # Empty and short texts stay on their own
+    groups = find_near_duplicates(['', '', 'Giá vàng tăng', 'Giá vàng tăng', base, base])
+    print(groups)
+    assert groups == [0, 1, 2, 3, 4, 4]
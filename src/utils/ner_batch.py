@@ -0,0 +1,53 @@
+# Batched inference through the underthesea deep NER model
+
+import logging
+
+
+def merge_subwords(output):
+    '''Merge "##" word pieces like underthesea.ner(deep=True) does'''
+    if len(output) == 0:
+        return []
+    entities = [output[0]]
+    for item in output[1:]:
+        if item['word'].startswith('##'):
+            entities[-1]['word'] = entities[-1]['word'] + item['word'][2:]
+            entities[-1]['end'] = item['end']
+        else:
+            entities.append(item)
+    return entities
+
+
+def batch_ner(sentences, batch_size=32):
+    '''Tag sentences with the deep NER model, batch_size sentences at a time.
+
+    Sentences are sorted by length so each batch needs little padding. Results
+    are returned in the order of sentences, a sentence that fails is logged and
+    gets None, the same way a failing ner() call is skipped.
+    '''
+    # Loading the model is slow, only do it when NER actually runs
+    from underthesea.pipeline.ner.model_transformers import nlp
+
+    results = [[] for _ in sentences]
+    order = sorted(
+        (i for i, sentence in enumerate(sentences) if sentence.strip()),
+        key=lambda i: len(sentences[i]),
+    )
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        try:
+            outputs = nlp([sentences[i] for i in batch], batch_size=batch_size)
+        except Exception:
+            # Find the sentence that failed, keep the others
+            outputs = []
+            for i in batch:
+                try:
+                    outputs.append(nlp(sentences[i]))
+                except Exception as e:
+                    logging.error(f'Error in NER processing: {e}')
+                    outputs.append(None)
+
+        for i, output in zip(batch, outputs):
+            results[i] = output if output is None else merge_subwords(output)
+
+    return results
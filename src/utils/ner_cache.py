@@ -0,0 +1,110 @@
+# Disk-backed cache of NER results per sentence
+
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def normalize_sentence(sentence):
+    return ' '.join(sentence.split())
+
+
+class NerCache:
+    '''SQLite cache of NER results keyed by sentence and model version.
+
+    Only the "entity" and "word" fields of each tagged token are kept, which is
+    all process_entities needs. New results and usage times are kept in memory
+    and written by flush() in one short transaction, so that several processes
+    can share the cache. When it grows over max_entries, the least recently
+    used sentences are evicted on flush().
+    '''
+
+    def __init__(self, path, model_version, max_entries=1_000_000):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._used = {}
+        self._new = {}
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ner '
+            '(key TEXT PRIMARY KEY, result TEXT, last_used REAL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS ner_last_used ON ner (last_used)'
+        )
+        self._conn.commit()
+
+    def _key(self, sentence):
+        text = self.model_version + '\0' + normalize_sentence(sentence)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, sentence):
+        '''Cached NER result of sentence, or None'''
+        key = self._key(sentence)
+        if key in self._new:
+            self.hits += 1
+            return self._decode(self._new[key])
+        row = self._conn.execute(
+            'SELECT result FROM ner WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used[key] = time.time()
+        return self._decode(row[0])
+
+    def _decode(self, result):
+        return [{'entity': entity, 'word': word} for entity, word in json.loads(result)]
+
+    def put(self, sentence, result):
+        self._new[self._key(sentence)] = json.dumps(
+            [[e['entity'], e['word']] for e in result], ensure_ascii=False
+        )
+
+    def pop_stats(self):
+        '''Return (hits, misses) since the last call'''
+        stats = (self.hits, self.misses)
+        self.hits, self.misses = 0, 0
+        return stats
+
+    def flush(self):
+        '''Write new results and usage of hit sentences, evict the least
+        recently used sentences'''
+        now = time.time()
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO ner (key, result, last_used) VALUES (?, ?, ?)',
+            [(key, result, now) for key, result in self._new.items()],
+        )
+        self._new = {}
+        self._conn.executemany(
+            'UPDATE ner SET last_used = ? WHERE key = ?',
+            [(used, key) for key, used in self._used.items()],
+        )
+        self._used = {}
+
+        count = self._conn.execute('SELECT COUNT(*) FROM ner').fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                'DELETE FROM ner WHERE key IN '
+                '(SELECT key FROM ner ORDER BY last_used LIMIT ?)',
+                (count - self.max_entries,),
+            )
+        self._conn.commit()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+if __name__ == '__main__':
+    cache = NerCache(':memory:', 'test', max_entries=10)
+    print(cache.get('Ông Putin ca ngợi Liên Xô'))
+    cache.put('Ông Putin ca ngợi Liên Xô', [{'entity': 'B-PER', 'word': 'Putin'}])
+    cache.put('Liên Xô', [])
+    cache.flush()
+    print(cache.get('Ông  Putin ca ngợi Liên Xô'), cache.pop_stats())
@@ -0,0 +1,105 @@
+# Persistent entity and link store for incremental NER runs
+
+import json
+import sqlite3
+
+import pandas as pd
+
+
+class NerStore:
+    '''SQLite store of every entity and link found so far.
+
+    Entities keep the id they were first given. Links are keyed by their
+    (from, to) entity names, ordered so that from < to, and accumulate the ids
+    of the articles they occur in, their weight is the number of those
+    articles. Processed article ids are recorded so that a later run only
+    needs to tag new articles.
+    '''
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS articles (id TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS entities (
+                entity TEXT PRIMARY KEY, id TEXT, type TEXT
+            );
+            CREATE TABLE IF NOT EXISTS links (
+                "from" TEXT, "to" TEXT, id TEXT, article_ids TEXT, weight INTEGER,
+                PRIMARY KEY ("from", "to")
+            );
+        ''')
+        self._canonicalize_links()
+        self._conn.commit()
+
+    def _canonicalize_links(self):
+        '''Merge links stored as B-A into A-B, stores written before links were
+        ordered by name can hold both'''
+        rows = self._conn.execute(
+            'SELECT "from", "to", id, article_ids FROM links WHERE "from" > "to"'
+        ).fetchall()
+        if rows:
+            self._conn.execute('DELETE FROM links WHERE "from" > "to"')
+            for fr, to, link_id, article_ids in rows:
+                self._merge_link(to, fr, link_id, json.loads(article_ids))
+
+    def processed_articles(self):
+        return {row[0] for row in self._conn.execute('SELECT id FROM articles')}
+
+    def upsert_entities(self, df_entity):
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO entities (entity, id, type) VALUES (?, ?, ?)',
+            df_entity[['entity', 'id', 'type']].itertuples(index=False, name=None),
+        )
+        self._conn.commit()
+
+    def upsert_links(self, df_link):
+        '''Merge links, in as many chunks as needed'''
+        for fr, to, link_id, new_ids in df_link[
+            ['from', 'to', 'id', 'article_ids']
+        ].itertuples(index=False, name=None):
+            if fr > to:
+                fr, to = to, fr
+            self._merge_link(fr, to, link_id, new_ids)
+        self._conn.commit()
+
+    def _merge_link(self, fr, to, link_id, new_ids):
+        row = self._conn.execute(
+            'SELECT article_ids FROM links WHERE "from" = ? AND "to" = ?',
+            (fr, to),
+        ).fetchone()
+        if row is None:
+            ids = list(dict.fromkeys(new_ids))
+            self._conn.execute(
+                'INSERT INTO links ("from", "to", id, article_ids, weight) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (fr, to, link_id, json.dumps(ids), len(ids)),
+            )
+        else:
+            ids = list(dict.fromkeys(json.loads(row[0]) + list(new_ids)))
+            self._conn.execute(
+                'UPDATE links SET article_ids = ?, weight = ? '
+                'WHERE "from" = ? AND "to" = ?',
+                (json.dumps(ids), len(ids), fr, to),
+            )
+
+    def add_articles(self, article_ids):
+        '''Record articles as processed, once all their links are merged'''
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO articles (id) VALUES (?)',
+            ((article_id,) for article_id in article_ids),
+        )
+        self._conn.commit()
+
+    def export(self):
+        '''Return every entity and link as DataFrames in the ner_run format'''
+        df_entity = pd.read_sql_query(
+            'SELECT id, entity, type FROM entities', self._conn
+        )
+        df_link = pd.read_sql_query(
+            'SELECT "from", "to", id, article_ids, weight FROM links', self._conn
+        )
+        df_link['article_ids'] = df_link['article_ids'].map(json.loads)
+        return df_entity, df_link
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,194 @@
+# Centrality scores of the entity graph on a sparse adjacency matrix
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def get_adjacency(fr, to, weight):
+    '''Symmetric CSR adjacency matrix of an undirected weighted graph.
+
+    Like adding the edges to a networkx Graph, a pair given several times keeps
+    its last weight. Returns the matrix and the node of every row.
+    '''
+    df = pd.DataFrame({'from': fr, 'to': to, 'weight': weight})
+    codes, nodes = pd.factorize(pd.concat([df['from'], df['to']]), sort=False)
+    rows, cols = codes[:len(df)], codes[len(df):]
+
+    lo, hi = np.minimum(rows, cols), np.maximum(rows, cols)
+    last = ~pd.DataFrame({'lo': lo, 'hi': hi}).duplicated(keep='last').values
+    lo, hi = lo[last], hi[last]
+    weight = df['weight'].values[last].astype(np.float64)
+
+    # A self-loop is a single entry on the diagonal
+    off = lo != hi
+    adjacency = sparse.csr_matrix(
+        (
+            np.concatenate([weight, weight[off]]),
+            (np.concatenate([lo, hi[off]]), np.concatenate([hi, lo[off]])),
+        ),
+        shape=(len(nodes), len(nodes)),
+    )
+    return adjacency, np.asarray(nodes)
+
+
+def eigenvector_centrality(adjacency, tol=1e-6, max_iter=1000, nstart=None):
+    '''Eigenvector centrality by power iteration on A + I, as networkx does.
+
+    nstart is the starting vector, e.g. the scores of the day before, which
+    usually converges in a few iterations.
+    '''
+    n = adjacency.shape[0]
+    x = np.ones(n) if nstart is None else np.asarray(nstart, dtype=np.float64)
+    if not x.any():
+        raise ValueError('initial vector cannot have all zero values')
+    x = x / x.sum()
+
+    for _ in range(max_iter):
+        last = x
+        x = last + adjacency.T @ last
+        x = x / (np.linalg.norm(x) or 1)
+        if np.abs(x - last).sum() < n * tol:
+            return x
+    raise RuntimeError(f'power iteration did not converge in {max_iter} steps')
+
+
+def pagerank(adjacency, alpha=0.85, tol=1e-6, max_iter=1000, nstart=None):
+    '''Weighted PageRank, dangling nodes jump uniformly like in networkx'''
+    n = adjacency.shape[0]
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = degree == 0
+    inverse = np.divide(1.0, degree, out=np.zeros(n), where=~dangling)
+    transition = sparse.diags(inverse) @ adjacency
+
+    x = np.ones(n) if nstart is None else np.asarray(nstart, dtype=np.float64)
+    x = x / x.sum()
+    for _ in range(max_iter):
+        last = x
+        x = transition.T @ last + last[dangling].sum() / n
+        x = alpha * x + (1 - alpha) / n
+        if np.abs(x - last).sum() < n * tol:
+            return x
+    raise RuntimeError(f'power iteration did not converge in {max_iter} steps')
+
+
+def weighted_degree(adjacency):
+    # A self-loop counts twice, like in networkx
+    return np.asarray(adjacency.sum(axis=1)).ravel() + adjacency.diagonal()
+
+
+def compute_scores(adjacency, tol=1e-6, max_iter=1000, nstart=None):
+    '''Eigenvector centrality, PageRank and weighted degree of every node.
+
+    nstart warm starts the eigenvector centrality.
+    '''
+    return {
+        'eigenvector': eigenvector_centrality(adjacency, tol, max_iter, nstart),
+        'pagerank': pagerank(adjacency, tol=tol, max_iter=max_iter),
+        'degree': weighted_degree(adjacency),
+    }
+
+
+# Unweighted adjacency of the betweenness worker processes, shared read-only
+_paths_adjacency = None
+
+
+def get_num_samples(num_nodes, epsilon, delta):
+    '''Number of sampled sources so that with probability 1 - delta, every
+    normalized betweenness is within epsilon of the exact one (Hoeffding bound
+    with a union bound over the nodes)'''
+    k = math.ceil(math.log(2 * num_nodes / delta) / (2 * epsilon ** 2))
+    return min(k, num_nodes)
+
+
+def _init_paths_worker(indptr, indices, num_nodes):
+    global _paths_adjacency
+    data = np.ones(len(indices), dtype=np.float64)
+    _paths_adjacency = sparse.csr_matrix(
+        (data, indices, indptr), shape=(num_nodes, num_nodes)
+    )
+
+
+def _source_dependencies(sources):
+    '''Sum of the Brandes dependencies of every node on sources.
+
+    Breadth-first search from all sources at once, one column per source, a
+    level at a time with sparse products, then the dependencies are
+    accumulated back from the deepest level.
+    '''
+    adjacency = _paths_adjacency
+    n, b = adjacency.shape[0], len(sources)
+    columns = np.arange(b)
+
+    dist = np.full((n, b), -1, dtype=np.int32)
+    sigma = np.zeros((n, b))
+    dist[sources, columns] = 0
+    sigma[sources, columns] = 1.0
+
+    frontier = sigma.copy()
+    depth = 0
+    while True:
+        paths = adjacency @ frontier
+        new = (paths > 0) & (dist < 0)
+        if not new.any():
+            break
+        depth += 1
+        dist[new] = depth
+        sigma[new] = paths[new]
+        frontier = np.where(new, paths, 0.0)
+
+    dependency = np.zeros((n, b))
+    for level in range(depth, 0, -1):
+        at_level = dist == level
+        safe_sigma = np.where(at_level, sigma, 1.0)
+        coefficient = np.where(at_level, (1.0 + dependency) / safe_sigma, 0.0)
+        parents = dist == level - 1
+        dependency[parents] += (sigma * (adjacency @ coefficient))[parents]
+
+    dependency[sources, columns] = 0.0
+    return dependency.sum(axis=1)
+
+
+def betweenness_centrality(adjacency, k=None, seed=None, workers=1,
+                           batch_size=64):
+    '''Normalized betweenness centrality of the unweighted graph, from the
+    shortest paths of k sampled sources, of all nodes if k is None.
+
+    Sources are processed in batches of batch_size over workers processes,
+    which share the adjacency read-only. Sampled scores are rescaled like
+    networkx.betweenness_centrality(k=k) does.
+    '''
+    n = adjacency.shape[0]
+    if n <= 2:
+        return np.zeros(n)
+
+    # Only the structure matters, self-loops are never on a shortest path
+    structure = sparse.csr_matrix(adjacency, copy=True)
+    structure.setdiag(0)
+    structure.eliminate_zeros()
+    structure.sort_indices()
+    initargs = (structure.indptr, structure.indices, n)
+
+    k = n if k is None else min(k, n)
+    rng = np.random.default_rng(seed)
+    sources = np.sort(rng.choice(n, size=k, replace=False))
+    batches = [sources[i:i + batch_size] for i in range(0, k, batch_size)]
+
+    betweenness = np.zeros(n)
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_paths_worker,
+                                 initargs=initargs) as executor:
+            for dependency in executor.map(_source_dependencies, batches):
+                betweenness += dependency
+    else:
+        _init_paths_worker(*initargs)
+        for batch in batches:
+            betweenness += _source_dependencies(batch)
+
+    # A source has no dependency on itself, it is estimated from k - 1 sources
+    scale = np.full(n, 1.0 / (k * (n - 2)))
+    scale[sources] = 1.0 / ((k - 1) * (n - 2)) if k > 1 else np.nan
+    return betweenness * scale
@@ -0,0 +1,118 @@
+# On-disk index of scraped article URLs and content hashes
+
+import datetime
+import hashlib
+import sqlite3
+import threading
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'zarsrc', 'gidzl')
+
+
+def canonicalize_url(url):
+    '''Normalize url so that the same article always maps to the same key
+
+    Scheme, "www.", fragment, trailing slash and tracking parameters are dropped.
+    '''
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parsed.path.rstrip('/')
+    query = urlencode([
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ])
+    return host + path + ('?' + query if query else '')
+
+
+def hash_content(content):
+    '''SHA-1 of content with whitespace collapsed'''
+    return hashlib.sha1(' '.join(content.split()).encode('utf-8')).hexdigest()
+
+
+class SeenIndex:
+    '''SQLite index of canonical URLs and content hashes already scraped.
+
+    claim() is checked before downloading an article and also deduplicates
+    within a run, so the same story listed in several feeds is downloaded once.
+    Articles passed to add() are only persisted by commit(), once they have
+    been written to the output.
+    '''
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._claimed = set()
+        self._pending = {}
+        self._pending_hashes = set()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, first_seen TEXT)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS hashes (hash TEXT PRIMARY KEY, url TEXT)'
+        )
+        self._conn.commit()
+
+    def claim(self, url):
+        '''Return True if url was never scraped, and reserve it for this run'''
+        key = canonicalize_url(url)
+        with self._lock:
+            if key in self._claimed:
+                return False
+            row = self._conn.execute(
+                'SELECT 1 FROM urls WHERE url = ?', (key,)
+            ).fetchone()
+            if row:
+                return False
+            self._claimed.add(key)
+            return True
+
+    def add(self, url, content):
+        '''Add url and its content, return False if the content was already seen'''
+        key = canonicalize_url(url)
+        content_hash = hash_content(content)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM hashes WHERE hash = ?', (content_hash,)
+            ).fetchone()
+            if row or content_hash in self._pending_hashes:
+                return False
+            self._pending[key] = content_hash
+            self._pending_hashes.add(content_hash)
+            return True
+
+    def commit(self, urls):
+        '''Persist the added articles among urls'''
+        today = datetime.date.today().isoformat()
+        with self._lock:
+            for url in urls:
+                key = canonicalize_url(url)
+                if key not in self._pending:
+                    continue
+                content_hash = self._pending.pop(key)
+                self._pending_hashes.discard(content_hash)
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO urls (url, first_seen) VALUES (?, ?)',
+                    (key, today),
+                )
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO hashes (hash, url) VALUES (?, ?)',
+                    (content_hash, key),
+                )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == '__main__':
+    print(canonicalize_url('https://www.vtv.vn/trong-nuoc/abc.htm/?utm_source=rss#top'))
+    index = SeenIndex(':memory:')
+    print(index.claim('https://vtv.vn/trong-nuoc/abc.htm'))
+    print(index.claim('http://www.vtv.vn/trong-nuoc/abc.htm'))
+    print(index.add('https://vtv.vn/trong-nuoc/abc.htm', 'Nội dung'))
+    print(index.add('https://plo.vn/abc.html', 'Nội  dung'))
+    index.commit(['https://vtv.vn/trong-nuoc/abc.htm'])
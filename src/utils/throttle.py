@@ -0,0 +1,61 @@
+# Per-host concurrency limits and politeness delays for concurrent scraping
+
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+def get_host(url):
+    '''Return the host of url without a leading "www."'''
+    host = urlparse(url).netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+class HostThrottle:
+    '''Limit concurrent requests per host and space them out by a delay.
+
+    The global cap is enforced by the size of the worker pool, this class only
+    makes sure no single host gets more than per_host requests at once and
+    that two requests to the same host start at least delay seconds apart.
+    '''
+
+    def __init__(self, per_host=2, delay=0.0):
+        self.per_host = per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+    def _wait_turn(self, host):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    @contextmanager
+    def slot(self, url):
+        '''Hold one of the per-host slots for url while the block runs'''
+        host = get_host(url)
+        semaphore = self._semaphore(host)
+        with semaphore:
+            if self.delay:
+                self._wait_turn(host)
+            yield
+
+
+if __name__ == '__main__':
+    throttle = HostThrottle(per_host=1, delay=0.5)
+    for _ in range(3):
+        with throttle.slot('https://vnexpress.net/rss/thoi-su.rss'):
+            print(time.monotonic())
@@ -1,22 +1,116 @@
 # Special handling of links scraped from vnnet rss feed
 
-import urllib.request
+import json
+import os
+import re
+import threading
+import time
+from contextlib import nullcontext
 
+import requests
+from requests.adapters import HTTPAdapter
+
+IID_PATTERN = re.compile(r'IID=(\d+)')
 
-def open_vnanet_article(article_link):
-    assert 'vnanet.vn' in article_link, 'Not a vnanet article'
 
-    # https://vnanet.vnhttps://vnanet.vn/Frontend/TrackingView.aspx?IID=XXXXXX 
+def fix_vnanet_link(article_link):
+    # https://vnanet.vnhttps://vnanet.vn/Frontend/TrackingView.aspx?IID=XXXXXX
     # -> https://vnanet.vn/Frontend/TrackingView.aspx?IID=XXXXXX
-    article_link = article_link.replace('https://vnanet.vnhttps://vnanet.vn', 'https://vnanet.vn')
+    return article_link.replace('https://vnanet.vnhttps://vnanet.vn', 'https://vnanet.vn')
+
+
+class VnanetResolver:
+    '''Resolve vnanet tracking links to the final article url.
+
+    Requests share a pooled session and only ask for headers. Resolved urls are
+    cached by tracking ID (IID) and optionally persisted to a JSON file, entries
+    older than ttl_days are evicted.
+    '''
+
+    def __init__(self, throttle=None, ttl_days=30, pool_size=32):
+        self.throttle = throttle
+        self.ttl = ttl_days * 24 * 3600
+        self.cache_path = None
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def load(self, cache_path):
+        '''Load the IID -> url cache from cache_path, it is saved back there'''
+        self.cache_path = cache_path
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                cache = json.load(f)
+            now = time.time()
+            with self._lock:
+                self._cache = {
+                    iid: entry for iid, entry in cache.items()
+                    if now - entry[1] < self.ttl
+                }
+
+    def save(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + '.tmp'
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _lookup(self, iid):
+        with self._lock:
+            entry = self._cache.get(iid)
+            if entry and time.time() - entry[1] < self.ttl:
+                return entry[0]
+            return None
 
-    try:
-        url = urllib.request.urlopen(article_link).geturl()
+    def _fetch(self, article_link):
+        slot = self.throttle.slot(article_link) if self.throttle else nullcontext()
+        with slot:
+            r = self._session.head(article_link, allow_redirects=True, timeout=20)
+            if not r.ok:
+                # Some servers refuse or mishandle HEAD (403, 404, 405, 501...),
+                # follow the redirects with GET without reading the body
+                r.close()
+                r = self._session.get(
+                    article_link, allow_redirects=True, timeout=20, stream=True
+                )
+                r.close()
+        r.raise_for_status()
+        return r.url
+
+    def resolve(self, article_link):
+        assert 'vnanet.vn' in article_link, 'Not a vnanet article'
+        article_link = fix_vnanet_link(article_link)
+
+        match = IID_PATTERN.search(article_link)
+        iid = match.group(1) if match else None
+        if iid:
+            url = self._lookup(iid)
+            if url:
+                return url
+
+        try:
+            url = self._fetch(article_link)
+        except Exception as e:
+            print(f'Error opening {article_link}:\n{e}')
+            return article_link
+
+        if iid:
+            with self._lock:
+                self._cache[iid] = [url, time.time()]
         return url
-    except Exception as e:
-        print(f'Error opening {article_link}:\n{e}')
-        return article_link
+
+
+vnanet_resolver = VnanetResolver()
+
+
+def open_vnanet_article(article_link):
+    return vnanet_resolver.resolve(article_link)
 
 if __name__ == '__main__':
     article_link = 'https://vnanet.vnhttps://vnanet.vn/Frontend/TrackingView.aspx?IID=6558139'
-    print(open_vnanet_article(article_link))
\ No newline at end of file
+    print(open_vnanet_article(article_link))
@@ -0,0 +1,184 @@
+# Rolling time-window entity graphs updated one day at a time
+
+import ast
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .scoring import get_adjacency, compute_scores
+
+# Output column of every score, as in compute_score.py
+SCORE_COLUMNS = {
+    'score': 'eigenvector',
+    'score_pagerank': 'pagerank',
+    'score_degree': 'degree',
+}
+
+
+def get_daily_links(df_link, article_dates):
+    '''Link weights of every day, the number of articles of the day a link
+    occurs in. article_dates maps article ids to their day.'''
+    article_ids = df_link['article_ids']
+    if len(article_ids) and isinstance(article_ids.iloc[0], str):
+        article_ids = article_ids.map(ast.literal_eval)
+
+    # A-B and B-A are the same link
+    fr, to = df_link['from'].values, df_link['to'].values
+    swap = fr > to
+    df = pd.DataFrame({
+        'from': np.where(swap, to, fr),
+        'to': np.where(swap, fr, to),
+        'article_id': article_ids.values,
+    }).explode('article_id')
+    df['date'] = df['article_id'].map(article_dates)
+    df = df.dropna(subset=['date']).drop_duplicates()
+
+    counts = df.groupby(['date', 'from', 'to']).size()
+    counts = counts.rename('weight').reset_index()
+    return {
+        date: group.drop(columns='date').reset_index(drop=True)
+        for date, group in counts.groupby('date')
+    }
+
+
+class RollingWindow:
+    '''Link weights over the last `days` days.
+
+    advance() adds the links of a new day and subtracts those of the days that
+    fell out of the window, so it costs time in proportion to the days changed
+    rather than to the whole window. Scores of the window are kept to warm
+    start the next computation.
+    '''
+
+    def __init__(self, days):
+        self.days = days
+        self.weights = {}
+        self.included = set()
+        self.scores = None
+
+    def add(self, df_delta, sign=1):
+        for key, weight in zip(
+            zip(df_delta['from'], df_delta['to']), df_delta['weight']
+        ):
+            weight = self.weights.get(key, 0) + sign * weight
+            if weight > 0:
+                self.weights[key] = weight
+            else:
+                self.weights.pop(key, None)
+
+    @property
+    def latest(self):
+        '''Latest day in the window, None if it is empty'''
+        return max(self.included) if self.included else None
+
+    def start(self, latest):
+        '''First day of the window that ends on latest'''
+        start = datetime.date.fromisoformat(latest) - datetime.timedelta(self.days - 1)
+        return start.isoformat()
+
+    def advance(self, date, load_delta):
+        '''Add the day date, load_delta(day) gives the links of a day. A day
+        older than the window is ignored, the window ends on its latest day.'''
+        start = self.start(max(date, self.latest or date))
+        if start <= date and date not in self.included:
+            self.add(load_delta(date))
+            self.included.add(date)
+
+        for day in sorted(day for day in self.included if day < start):
+            self.add(load_delta(day), sign=-1)
+            self.included.remove(day)
+
+    def to_frame(self):
+        return pd.DataFrame(
+            [(fr, to, weight) for (fr, to), weight in self.weights.items()],
+            columns=['from', 'to', 'weight'],
+        )
+
+    def score(self, tol=1e-6):
+        '''Scores of every node, the eigenvector centrality warm started from
+        the scores of the window before'''
+        df_link = self.to_frame()
+        if df_link.empty:
+            self.scores = pd.DataFrame(columns=SCORE_COLUMNS)
+            return self.scores
+
+        adjacency, nodes = get_adjacency(
+            df_link['from'], df_link['to'], df_link['weight']
+        )
+        nstart = None
+        if self.scores is not None and len(self.scores):
+            previous = self.scores['score'].reindex(nodes)
+            nstart = previous.fillna(self.scores['score'].mean()).values
+        scores = compute_scores(adjacency, tol=tol, nstart=nstart)
+
+        self.scores = pd.DataFrame(
+            {column: scores[name] for column, name in SCORE_COLUMNS.items()},
+            index=pd.Index(nodes, name='id'),
+        )
+        return self.scores
+
+
+class RollingWindows:
+    '''Rolling windows of several lengths kept in state_dir.
+
+    The links of every day are saved under deltas/ so that expired days can
+    be subtracted later, the links, days and scores of every window are saved
+    as window_<days>d files.
+    '''
+
+    def __init__(self, state_dir, windows=(1, 7, 30)):
+        self.state_dir = state_dir
+        os.makedirs(os.path.join(state_dir, 'deltas'), exist_ok=True)
+        self.windows = [self._load_window(days) for days in windows]
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def _load_window(self, days):
+        window = RollingWindow(days)
+        prefix = self._path(f'window_{days}d')
+        if os.path.exists(prefix + '.json'):
+            with open(prefix + '.json') as f:
+                window.included = set(json.load(f)['days'])
+            window.add(pd.read_csv(prefix + '_link.csv'))
+            window.scores = pd.read_csv(prefix + '_score.csv', index_col='id')
+        return window
+
+    def save_delta(self, date, df_delta):
+        df_delta.to_csv(self._path(f'deltas/{date}.csv'), index=False)
+
+    def load_delta(self, date):
+        path = self._path(f'deltas/{date}.csv')
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=['from', 'to', 'weight'])
+        return pd.read_csv(path)
+
+    def add_day(self, date, df_delta, tol=1e-6):
+        '''Add the links of a day to every window and rescore them'''
+        previous = self.load_delta(date)
+        self.save_delta(date, df_delta)
+        deltas = {date: df_delta}
+
+        def load_delta(day):
+            if day not in deltas:
+                deltas[day] = self.load_delta(day)
+            return deltas[day]
+
+        for window in self.windows:
+            if date in window.included:
+                # The day is added again, replace its links
+                window.add(previous, sign=-1)
+                window.add(df_delta)
+            window.advance(date, load_delta)
+            window.score(tol)
+            self._save_window(window)
+
+    def _save_window(self, window):
+        prefix = self._path(f'window_{window.days}d')
+        window.to_frame().to_csv(prefix + '_link.csv', index=False)
+        window.scores.to_csv(prefix + '_score.csv', index_label='id')
+        with open(prefix + '.json', 'w') as f:
+            json.dump({'days': sorted(window.included)}, f)
@@ -0,0 +1,85 @@
+# Streaming, checkpointed writer for scraped articles
+
+import os
+
+import pandas as pd
+
+ARTICLE_COLUMNS = ['id', 'url', 'title', 'pubDate', 'category', 'content', 'parser']
+
+
+class ArticleWriter:
+    '''Append scraped articles to the output csv as they are finished.
+
+    Finished feeds are listed in a checkpoint file next to the output. If the
+    checkpoint exists when the writer is opened, the previous run is resumed:
+    its rows are kept, finished feeds can be skipped with is_done() and urls
+    already written are not written again. close() removes the checkpoint.
+
+    With append, an existing output is always kept and new rows are added to
+    it, so that polling runs which only see new items add to the file of the
+    day instead of replacing it.
+    '''
+
+    def __init__(self, output_path, error_path, append=False):
+        self.output_path = output_path
+        self.error_path = error_path
+        self.checkpoint_path = output_path + '.checkpoint'
+        self.done = set()
+        self.urls = set()
+        self.columns = ARTICLE_COLUMNS
+
+        resume = os.path.exists(self.checkpoint_path)
+        if (resume or append) and os.path.exists(output_path):
+            if resume:
+                with open(self.checkpoint_path, 'r') as f:
+                    self.done = set(f.read().splitlines())
+            self.urls = set(pd.read_csv(output_path, usecols=['url'])['url'])
+            # Rows follow the header of the existing file
+            self.columns = list(pd.read_csv(output_path, nrows=0).columns)
+            if 'parser' not in self.columns:
+                self._add_parser_column()
+            open(self.checkpoint_path, 'a').close()
+        else:
+            pd.DataFrame(columns=ARTICLE_COLUMNS).to_csv(output_path, index=False)
+            open(self.error_path, 'w').close()
+            open(self.checkpoint_path, 'w').close()
+
+    def _add_parser_column(self):
+        '''Upgrade an output written before the parser column, all its rows
+        come from newspaper3k'''
+        df = pd.read_csv(self.output_path, dtype=str, keep_default_na=False)
+        df['parser'] = 'newspaper'
+        tmp_path = self.output_path + '.tmp'
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.output_path)
+        self.columns = list(df.columns)
+
+    def is_done(self, key):
+        return key in self.done
+
+    def write(self, articles, err_articles, key=None):
+        '''Append articles and error links, then mark key as finished'''
+        rows = []
+        for article in articles:
+            if article[1] not in self.urls:
+                self.urls.add(article[1])
+                rows.append(article)
+
+        if rows:
+            df = pd.DataFrame(rows, columns=ARTICLE_COLUMNS)
+            df.reindex(columns=self.columns).to_csv(
+                self.output_path, mode='a', header=False, index=False
+            )
+        if err_articles:
+            with open(self.error_path, 'a') as f:
+                f.writelines(err_article + '\n' for err_article in err_articles)
+
+        if key is not None:
+            with open(self.checkpoint_path, 'a') as f:
+                f.write(key + '\n')
+            self.done.add(key)
+
+    def close(self):
+        '''Finish the run, a later run starts from scratch'''
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
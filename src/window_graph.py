@@ -0,0 +1,62 @@
+import argparse
+import logging
+
+import pandas as pd
+
+from utils import RollingWindows, get_daily_links
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+def main(args):
+    """
+    Add the links of new articles to the rolling windows, one day at a time.
+    """
+    df_link = pd.read_csv(args.link)
+    df_articles = pd.read_csv(args.articles, usecols=["id", "pubDate"], dtype=str)
+    article_dates = df_articles.set_index("id")["pubDate"].str[:10]
+
+    windows = RollingWindows(
+        args.state, [int(days) for days in args.windows.split(",")]
+    )
+    for date, df_delta in sorted(get_daily_links(df_link, article_dates).items()):
+        windows.add_day(date, df_delta, tol=args.tol)
+        sizes = ", ".join(
+            f"{window.days}d: {len(window.weights)} links" for window in windows.windows
+        )
+        logging.info(f"Added {date} ({len(df_delta)} links), {sizes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Maintain entity graphs and scores over rolling day windows"
+    )
+    parser.add_argument(
+        "-l", "--link", help="Path to link csv file from ner_run.py", required=True
+    )
+    parser.add_argument(
+        "-a",
+        "--articles",
+        help="Path to articles csv file with the id and pubDate of the articles",
+        required=True,
+    )
+    parser.add_argument(
+        "-s",
+        "--state",
+        help="Directory of the daily links and the links and scores of every window",
+        default="data/windows/",
+    )
+    parser.add_argument(
+        "--windows", default="1,7,30", help="Comma separated window lengths in days"
+    )
+    parser.add_argument(
+        "--tol",
+        type=float,
+        default=1e-6,
+        help="Convergence tolerance of the power iterations",
+    )
+
+    args = parser.parse_args()
+    main(args)